@@ -0,0 +1,253 @@
+import os
+import csv
+import sys
+import argparse
+import numpy as np
+from array import array
+
+from corpus_io import Corpus
+
+"""
+Author index of a corpus file, built in a single pass and stored next to it (<corpus>.authors.npz):
+the sorted authors and, for each, the byte offsets (csv) or row numbers (Parquet) of their posts,
+so that the posts of a set of authors and the users common to two corpora are read without a full scan
+"""
+
+INDEX_SUFFIX = '.authors.npz'
+
+
+class LineTracker:
+    """
+    line iterator over a binary file for csv.reader, keeping the byte offset of the end of the last line read;
+    csv.reader pulls lines only as needed, so after each row the offset is that of the next row
+    """
+
+    def __init__(self, fin):
+        self.fin = fin
+        self.position = fin.tell()
+    # end def
+
+    def __iter__(self):
+        return self
+    # end def
+
+    def __next__(self):
+        line = self.fin.readline()
+        if not line:
+            raise StopIteration
+        # end if
+        self.position += len(line)
+        return line.decode('utf-8')
+    # end def
+# end class
+
+
+class AuthorIndex:
+    """
+    authors[i] wrote the rows pointers[starts[i]:starts[i + 1]], in corpus order; authors are stripped
+    of surrounding whitespace, rows shorter than min_length fields are not indexed (as the analysis
+    modules skip them)
+    """
+
+    def __init__(self, path, authors, starts, pointers, header=True, author_column=0, min_length=8):
+        self.path = path
+        self.authors = authors
+        self.starts = starts
+        self.pointers = pointers
+        self.header = header
+        self.author_column = author_column
+        self.min_length = min_length
+    # end def
+
+    @staticmethod
+    def index_path(path):
+        return str(path).rstrip('/') + INDEX_SUFFIX
+    # end def
+
+    @staticmethod
+    def fingerprint(path):
+        """
+        :param path: corpus csv file or Parquet directory
+        :return: (size, modification time) of the corpus files, to detect a stale index
+        """
+        files = [os.path.join(path, name) for name in sorted(os.listdir(path))] if os.path.isdir(path) else [path]
+        stats = [os.stat(filename) for filename in files]
+        return sum(stat.st_size for stat in stats), max(stat.st_mtime_ns for stat in stats)
+    # end def
+
+    @staticmethod
+    def build(path, header=True, author_column=0, min_length=8):
+        """
+        index a corpus in one pass over its author column
+        :param path: corpus csv file, or Parquet file/directory (see corpus_io)
+        :param header: whether a csv file starts with a header row
+        :param author_column: position of the author column
+        :param min_length: int
+            csv rows with fewer fields are not indexed
+        :return: AuthorIndex
+        """
+        authors = []
+        pointers = array('Q')
+        if Corpus.is_parquet(path):
+            for row, (author,) in enumerate(Corpus.read_columns(path, [author_column])):
+                authors.append(author.strip())
+                pointers.append(row)
+            # end for
+        else:
+            csv.field_size_limit(sys.maxsize)
+            with open(path, 'rb') as fin:
+                lines = LineTracker(fin)
+                csv_reader = csv.reader(lines, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
+                if header:
+                    csv_reader.__next__()
+                # end if
+                start = lines.position
+                for line in csv_reader:
+                    if len(line) >= min_length:
+                        authors.append(line[author_column].strip())
+                        pointers.append(start)
+                    # end if
+                    start = lines.position
+                # end for
+            # end with
+        # end if
+
+        unique_authors, inverse = np.unique(np.array(authors, dtype=str), return_inverse=True)
+        order = np.argsort(inverse, kind='stable')
+        starts = np.zeros(len(unique_authors) + 1, dtype=np.uint64)
+        np.cumsum(np.bincount(inverse, minlength=len(unique_authors)), out=starts[1:])
+        pointers = np.frombuffer(pointers, dtype=np.uint64)[order] if len(pointers) else \
+            np.zeros(0, dtype=np.uint64)
+        return AuthorIndex(path, unique_authors, starts, pointers, header, author_column, min_length)
+    # end def
+
+    def save(self):
+        size, mtime = AuthorIndex.fingerprint(self.path)
+        tmp_path = AuthorIndex.index_path(self.path) + '.tmp.npz'
+        np.savez(tmp_path, authors=self.authors, starts=self.starts, pointers=self.pointers,
+                 settings=np.array([size, mtime, int(self.header), self.author_column, self.min_length],
+                                   dtype=np.int64))
+        os.replace(tmp_path, AuthorIndex.index_path(self.path))
+    # end def
+
+    @staticmethod
+    def open(path, header=True, author_column=0, min_length=8):
+        """
+        load the stored index of a corpus, (re)building and storing it if missing, stale or built
+        with other settings
+        :return: AuthorIndex
+        """
+        index_path = AuthorIndex.index_path(path)
+        if os.path.exists(index_path):
+            with np.load(index_path) as stored:
+                settings = [int(value) for value in stored['settings']]
+                if settings == list(AuthorIndex.fingerprint(path)) + [int(header), author_column, min_length]:
+                    return AuthorIndex(path, stored['authors'], stored['starts'], stored['pointers'], header,
+                                       author_column, min_length)
+                # end if
+            # end with
+        # end if
+        index = AuthorIndex.build(path, header, author_column, min_length)
+        index.save()
+        return index
+    # end def
+
+    def __len__(self):
+        return len(self.authors)
+    # end def
+
+    def position(self, author):
+        i = int(np.searchsorted(self.authors, author))
+        return i if i < len(self.authors) and self.authors[i] == author else None
+    # end def
+
+    def __contains__(self, author):
+        return self.position(author) is not None
+    # end def
+
+    def count(self, author):
+        """
+        :return: number of posts by author
+        """
+        i = self.position(author)
+        return 0 if i is None else int(self.starts[i + 1] - self.starts[i])
+    # end def
+
+    def common_authors(self, other):
+        """
+        :param other: AuthorIndex of another corpus
+        :return: set of the authors with posts in both corpora
+        """
+        return set(np.intersect1d(self.authors, other.authors, assume_unique=True).tolist())
+    # end def
+
+    def select(self, authors):
+        """
+        :param authors: iterable of authors
+        :return: numpy array of the pointers to all their posts, in corpus order
+        """
+        selected = [self.pointers[self.starts[i]:self.starts[i + 1]]
+                    for i in (self.position(author) for author in authors) if i is not None]
+        return np.sort(np.concatenate(selected)) if selected else np.zeros(0, dtype=np.uint64)
+    # end def
+
+    def read_rows(self, pointers, columns):
+        """
+        :param pointers: numpy array of pointers in corpus order, e.g. from select
+        :param columns: list of column positions
+        :return: generator of tuples of str, the values of the columns in the requested order
+        """
+        if Corpus.is_parquet(self.path):
+            _, ds, _ = Corpus.arrow()
+            dataset = ds.dataset(self.path, format='parquet')
+            names = dataset.schema.names
+            table = dataset.take(np.asarray(pointers, dtype=np.int64), columns=[names[i] for i in columns])
+            yield from zip(*(column.to_pylist() for column in table.columns))
+            return
+        # end if
+
+        csv.field_size_limit(sys.maxsize)
+        with open(self.path, 'rb') as fin:
+            lines = LineTracker(fin)
+            csv_reader = None
+            for pointer in pointers:
+                if csv_reader is None or lines.position != pointer:
+                    # not right after the previous row: seek, and restart the reader there
+                    fin.seek(int(pointer))
+                    lines.position = int(pointer)
+                    csv_reader = csv.reader(lines, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
+                # end if
+                line = csv_reader.__next__()
+                yield tuple(line[i] for i in columns)
+            # end for
+        # end with
+    # end def
+
+    def posts(self, authors, columns):
+        """
+        :param authors: iterable of authors
+        :param columns: list of column positions
+        :return: generator of tuples of str, the requested columns of all the posts by authors, in corpus order
+        """
+        return self.read_rows(self.select(authors), columns)
+    # end def
+# end class
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='builds the author indexes of corpus files')
+    parser.add_argument('filenames', nargs='+')
+    parser.add_argument('--no_header', action='store_true', help='the csv files have no header row')
+    parser.add_argument('--min_length', type=int, default=8, help='csv rows with fewer fields are not indexed')
+    args = parser.parse_args()
+
+    indexes = [AuthorIndex.open(filename, not args.no_header, min_length=args.min_length)
+               for filename in args.filenames]
+    for filename, index in zip(args.filenames, indexes):
+        print(filename, len(index), 'authors', len(index.pointers), 'posts')
+    # end for
+    if len(indexes) == 2:
+        print('common authors:', len(indexes[0].common_authors(indexes[1])))
+    # end if
+
+# end if
@@ -0,0 +1,175 @@
+import os
+import csv
+import sys
+import glob
+import argparse
+
+"""
+Corpus files (e.g. cs_main_reddit_corpus.csv) as CSV or as partitioned Parquet: a one-time converter, and a
+loader reading only the requested columns of either format, with author/subreddit filters pushed down
+to the Parquet scan. Columns are addressed by position, as in the csv.reader loops of the analysis modules
+"""
+
+ROWS_PER_FILE = 1000000
+ROW_GROUP_SIZE = 100000
+BATCH_SIZE = 65536
+
+
+class Corpus:
+    @staticmethod
+    def arrow():
+        """
+        pyarrow is imported on first use: importing it (and the pandas it pulls in) takes a good part of a second,
+        which every analysis module would otherwise pay at startup even when reading csv files
+        :return: the pyarrow, pyarrow.dataset and pyarrow.parquet modules
+        """
+        try:
+            import pyarrow as pa
+            import pyarrow.dataset as ds
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError('the Parquet corpus format requires the pyarrow package')
+        # end try
+        return pa, ds, pq
+    # end def
+
+    @staticmethod
+    def is_parquet(path):
+        """
+        :param path: corpus location
+        :return: True for a Parquet file or a directory of Parquet files
+        """
+        return os.path.isdir(path) or str(path).endswith('.parquet')
+    # end def
+
+    @staticmethod
+    def to_parquet(filename, out_dir=None, header=True, rows_per_file=ROWS_PER_FILE):
+        """
+        convert a corpus csv file into a directory of Parquet files (part-00000.parquet, ...) of string columns;
+        rows with fewer fields than the header (or than the first row, without a header) are skipped,
+        extra fields are dropped; the parts of an earlier conversion into out_dir are deleted
+        :param filename: corpus csv file
+        :param out_dir: output directory, <filename without .csv>.parquet by default
+        :param header: whether the csv file starts with a header row; otherwise columns are named c0, c1, ...
+        :param rows_per_file: int
+            rows per Parquet file
+        :return: output directory
+        """
+        pa, _, _ = Corpus.arrow()
+        if out_dir is None:
+            out_dir = (filename[:-len('.csv')] if filename.endswith('.csv') else filename) + '.parquet'
+        os.makedirs(out_dir, exist_ok=True)
+        # parts of an earlier conversion would otherwise be read as rows of this one
+        for stale in glob.glob(os.path.join(out_dir, 'part-*.parquet')):
+            os.remove(stale)
+        # end for
+
+        csv.field_size_limit(sys.maxsize)
+        with open(filename, 'r') as fin:
+            csv_reader = csv.reader(fin, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
+            names = csv_reader.__next__()
+            rows = []
+            if not header:
+                rows.append(names)
+                names = ['c' + str(i) for i in range(len(names))]
+            # end if
+            schema = pa.schema([(name, pa.string()) for name in names])
+
+            part = 0
+            for line in csv_reader:
+                if len(line) < len(names): continue
+                rows.append(line[:len(names)])
+                if len(rows) == rows_per_file:
+                    Corpus.write_part(rows, schema, out_dir, part)
+                    rows = []
+                    part += 1
+                # end if
+            # end for
+            if rows or part == 0:
+                Corpus.write_part(rows, schema, out_dir, part)
+            # end if
+        # end with
+        return out_dir
+    # end def
+
+    @staticmethod
+    def write_part(rows, schema, out_dir, part):
+        pa, _, pq = Corpus.arrow()
+        columns = [pa.array([row[i] for row in rows], type=pa.string()) for i in range(len(schema))]
+        pq.write_table(pa.Table.from_arrays(columns, schema=schema),
+                       os.path.join(out_dir, 'part-{0:05d}.parquet'.format(part)), row_group_size=ROW_GROUP_SIZE)
+    # end def
+
+    @staticmethod
+    def read_columns(path, columns, include=None, exclude=None, header=True, min_length=None):
+        """
+        iterate over the requested columns of a corpus, as csv or Parquet
+        :param path: corpus csv file, or Parquet file/directory (see to_parquet)
+        :param columns: list of column positions
+        :param include: dict column position -> set of values; only rows whose value is in the set are returned
+        :param exclude: dict column position -> set of values; rows whose value is in the set are skipped
+        :param header: whether a csv file starts with a header row (Parquet files keep it as their schema)
+        :param min_length: int
+            skip csv rows with fewer fields, max(columns) + 1 by default (converted files only hold full rows)
+        :return: generator of tuples of str, the values of the columns in the requested order
+        """
+        include = include or {}
+        exclude = exclude or {}
+        if Corpus.is_parquet(path):
+            yield from Corpus.read_parquet_columns(path, columns, include, exclude)
+            return
+        # end if
+
+        if min_length is None:
+            min_length = max(list(columns) + list(include) + list(exclude)) + 1
+        # end if
+        with open(path, 'r') as fin:
+            csv_reader = csv.reader(fin, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
+            if header:
+                csv_reader.__next__()
+            # end if
+            for line in csv_reader:
+                if len(line) < min_length: continue
+                if any(line[i] not in values for i, values in include.items()): continue
+                if any(line[i] in values for i, values in exclude.items()): continue
+                yield tuple(line[i] for i in columns)
+            # end for
+        # end with
+    # end def
+
+    @staticmethod
+    def read_parquet_columns(path, columns, include, exclude):
+        pa, ds, _ = Corpus.arrow()
+        dataset = ds.dataset(path, format='parquet')
+        names = dataset.schema.names
+
+        condition = None
+        for values, negate in [(include, False), (exclude, True)]:
+            for i, allowed in values.items():
+                term = ds.field(names[i]).isin(pa.array(list(allowed), type=pa.string()))
+                term = ~term if negate else term
+                condition = term if condition is None else condition & term
+            # end for
+        # end for
+
+        scanner = dataset.scanner(columns=[names[i] for i in columns], filter=condition, batch_size=BATCH_SIZE)
+        for batch in scanner.to_batches():
+            yield from zip(*(column.to_pylist() for column in batch.columns))
+        # end for
+    # end def
+# end class
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='converts corpus csv files to partitioned Parquet')
+    parser.add_argument('filenames', nargs='+')
+    parser.add_argument('--no_header', action='store_true', help='the csv files have no header row')
+    parser.add_argument('--rows_per_file', type=int, default=ROWS_PER_FILE)
+    args = parser.parse_args()
+
+    for filename in args.filenames:
+        print(filename, '->', Corpus.to_parquet(filename, header=not args.no_header,
+                                                rows_per_file=args.rows_per_file))
+    # end for
+
+# end if
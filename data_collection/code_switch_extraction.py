@@ -1,8 +1,16 @@
-import json
 import re
-import pandas as pd
+import csv
+import time
+import argparse
 import numpy as np
-from post import Post
+from collections import deque
+from post import Post, PostBatch
+from dump_io import compression_of, find_dump, get_decoder, open_dump
+from dump_index import DumpIndex, read_range
+from en_function_words import FUNCTION_WORDS
+from text_cleaning import sanitize_text
+from detection_cache import DetectionCache
+from translation_filter import TranslationMatcher
 from polyglot.detect import Detector
 
 import spacy
@@ -10,103 +18,475 @@ import xx_ent_wiki_sm
 import multiprocessing as mp
 from pathlib import Path
 
-spacy.require_gpu()
-nlp = xx_ent_wiki_sm.load()
+INPUT_FOLDER = "/ais/hal9000/masih/codeswitch/allposts/"
+CHUNK_SIZE = 2000  # dump lines per unit of work
+NER_BATCH_SIZE = 1000
+JSON_DECODER = "auto"  # see dump_io.available_decoders
+JSON_PROJECTION = False  # records are dropped right after parse_record, dump_io.benchmark_decoders favours full decoding
+PIPELINE_VERSION = "1"  # bump when clean_text or the detection changes, to invalidate the detection cache
+
+nlp = None  # loaded once per process by load_models
+ner_batch_size = NER_BATCH_SIZE
+ner_processes = 1
+detection_cache = None  # opened per process by load_models
+decode_record = get_decoder(JSON_DECODER, JSON_PROJECTION)
+english_words = set(FUNCTION_WORDS)  # extended with the nltk english word list by load_models
 false_langs = {"kn", "un", "or", "chr", "xx"}
-translation_words = np.loadtxt("translation_prob.csv", usecols=0, dtype="str")
-translation_words = set(translation_words)
+translation_matcher = TranslationMatcher.from_file("translation_prob.csv")
+ascii_word = re.compile("[a-z]+")
 
 
-def code_switch_polyglot(country, translation=True):
+class FilterStats:
     """
-    Function to find code switch posts given a country
-    :param translation: bool
-        if we should remove translation posts
-    :param country: str country to find code switching posts in
-    :return: array
-        array of Post objects
+    Per-stage counters of the find_langs filter cascade: how many posts reached a stage,
+    how many it rejected and the time spent in it; stats of worker processes are merged
+    """
+    STAGES = ["url", "translation", "signal", "clean", "detect"]
+
+    def __init__(self):
+        self.seen = dict.fromkeys(self.STAGES, 0)
+        self.rejected = dict.fromkeys(self.STAGES, 0)
+        self.seconds = dict.fromkeys(self.STAGES, 0.0)
+        self.cache_hits = 0
+
+    def record(self, stage, rejected, started):
+        """
+        :param stage: str stage name
+        :param rejected: bool
+            if the stage rejected the post
+        :param started: float
+            time.perf_counter() at the start of the stage
+        :return: bool
+            rejected, for convenience
+        """
+        self.seen[stage] += 1
+        self.rejected[stage] += int(rejected)
+        self.seconds[stage] += time.perf_counter() - started
+        return rejected
+
+    def merge(self, other):
+        for stage in self.STAGES:
+            self.seen[stage] += other.seen[stage]
+            self.rejected[stage] += other.rejected[stage]
+            self.seconds[stage] += other.seconds[stage]
+        self.cache_hits += other.cache_hits
+
+    def report(self):
+        """
+        :return: str
+            a table of per-stage counts, rejection rates and time per post
+        """
+        lines = ["stage\tseen\trejected\trate\tus/post"]
+        for stage in self.STAGES:
+            seen = self.seen[stage]
+            rate = float(self.rejected[stage]) / seen if seen else 0.0
+            per_post = 1e6 * self.seconds[stage] / seen if seen else 0.0
+            lines.append(f"{stage}\t{seen}\t{self.rejected[stage]}\t{rate:.3f}\t{per_post:.1f}")
+        lines.append(f"detection cache hits: {self.cache_hits}")
+        return "\n".join(lines)
+
+
+filter_stats = FilterStats()  # totals over all processed chunks
+
+
+def load_models(use_gpu=False, batch_size=NER_BATCH_SIZE, n_process=1, cache_path=None):
+    """
+    Load the NER model (and warm up polyglot) in the current process;
+    used as the initializer of worker processes, so that every worker loads them exactly once
+    :param use_gpu: bool
+        run spaCy on the GPU, CPU otherwise
+    :param batch_size: int
+        number of texts per nlp.pipe batch in clean_texts
+    :param n_process: int
+        number of nlp.pipe processes in clean_texts (only outside a worker pool)
+    :param cache_path: location of the SQLite detection cache, None to work without a cache
+    """
+    global nlp, ner_batch_size, ner_processes, detection_cache
+    if use_gpu:
+        spacy.require_gpu()
+    nlp = xx_ent_wiki_sm.load()
+    ner_batch_size = batch_size
+    ner_processes = n_process
+    if cache_path is not None:
+        # cleaned texts depend on the NER model too
+        version = f"{PIPELINE_VERSION}:{nlp.meta['name']}-{nlp.meta['version']}"
+        detection_cache = DetectionCache(cache_path, version)
+    Detector("warming up the language detector", quiet=True)
+    try:
+        from nltk.corpus import words
+        english_words.update(word.lower() for word in words.words())
+    except (ImportError, LookupError):
+        print("nltk english word list is not available, the signal filter uses function words only")
+
+
+def parse_record(line):
     """
-    global valid_countries
-    comments = []
-    input_folder = Path("/ais/hal9000/masih/codeswitch/allposts/")
-    final_file = input_folder / f"{country}.comment.json.out"
+    Extract the fields of a single dump line
+    :param line: str a JSON line of the raw dump
+    :return: tuple
+        (author, sub_reddit, date, post_id, link_id, parent_id, raw_text),
+        None if the line is not a post by a human user
+    """
+    data = decode_record(line)
 
-    with open(final_file, "r") as posts:
+    if "subreddit" in data.keys():
+        sub_reddit = data["subreddit"]
 
-        for line in posts:
+    else:
+        return None
 
-            data = json.loads(line)
+    author = data["author"]
+    if ("bot" in author.lower()) or ("AutoModerator" in author):
+        return None
+    date = data["created_utc"]
+    post_id = data["id"]
+    link_id = data["link_id"]
+    parent_id = data["parent_id"]
 
-            if "subreddit" in data.keys():
-                sub_reddit = data["subreddit"]
+    if "body" in data.keys():
+        raw_text = data["body"]
 
-            else:
-                continue
+    elif "selftext" in data.keys():
 
-            author = data["author"]
-            if ("bot" in author.lower()) or ("AutoModerator" in author):
-                continue
-            date = data["created_utc"]
-            post_id = data["id"]
-            link_id = data["link_id"]
-            parent_id = data["parent_id"]
+        raw_text = data["selftext"]
+    else:
+        return None
 
-            if "body" in data.keys():
-                raw_text = data["body"]
+    return author, sub_reddit, date, post_id, link_id, parent_id, raw_text
 
-            elif "selftext" in data.keys():
 
-                raw_text = data["selftext"]
-            else:
-                continue
+def process_chunk(task):
+    """
+    Unit of work of a worker process: the cheap filters run post by post,
+    the surviving posts are cleaned in NER batches and then detected
+    :param task: tuple
+        (country, list of dump lines or a (dump path, start, end) byte range, translation)
+    :return: tuple
+        PostBatch of the code switch posts of the chunk in dump order, FilterStats of the chunk
+    """
+    country, lines, translation = task
+    if isinstance(lines, tuple):
+        lines = read_range(*lines)
+    comments = PostBatch()
+    stats = FilterStats()
+    candidates = []
+    for line in lines:
+        record = parse_record(line)
+        if record is not None and prefilter(record[-1], translation, stats):
+            candidates.append(record)
+
+    # cleaning and detection are looked up in the cache first, only the misses are cleaned
+    started = time.perf_counter()
+    raw_texts = [record[-1] for record in candidates]
+    cached = detection_cache.get_many(raw_texts) if detection_cache is not None else [None] * len(raw_texts)
+    misses = [raw_text for raw_text, entry in zip(raw_texts, cached) if entry is None]
+    cleaned = iter(clean_texts(misses))
+    hits = [entry is not None for entry in cached]
+    for i, entry in enumerate(cached):
+        if entry is None:
+            cached[i] = (next(cleaned), None)
+    stats.cache_hits += sum(hits)
+    stats.seconds["clean"] += time.perf_counter() - started
+
+    updates = []
+    for record, hit, (clean_string, detection) in zip(candidates, hits, cached):
+        langs, new_detection = postfilter(clean_string, translation, stats, detection)
+        # store new entries and detections computed for entries cached without one
+        if detection_cache is not None and (not hit or new_detection is not detection):
+            updates.append((record[-1], clean_string, new_detection))
+        if langs is None:
+            continue
+        author, sub_reddit, date, post_id, link_id, parent_id, raw_text = record
+        lang1 = langs[0]
+        lang2 = langs[1]
+        confidence = langs[2]
+        comments.add(author, sub_reddit, date, country, confidence, raw_text,
+                     lang1,
+                     lang2, post_id, link_id, parent_id)
+    if updates:
+        detection_cache.put_many(updates)
+    return comments, stats
+
+
+def iter_chunks(lines, chunk_size=CHUNK_SIZE):
+    """
+    Group an iterable of lines into lists of chunk_size lines
+    :param lines: iterable of str
+    :param chunk_size: int
+    :return: generator of lists
+    """
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
 
-            langs = find_langs(raw_text, translation)
-            if langs is None:
-                continue
-            else:
 
-                lang1 = langs[0]
-                lang2 = langs[1]
-                confidence = langs[2]
-                code_switch = Post(author, sub_reddit, date, country, confidence, raw_text,
-                                   lang1,
-                                   lang2, post_id, link_id, parent_id)
-            comments.append(code_switch)
-        posts.close()
+def ordered_imap(pool, func, tasks, max_in_flight):
+    """
+    Like pool.imap, but reads the tasks lazily: at most max_in_flight tasks are queued at a
+    time, so a multi-GB dump is never loaded into the task queue; results keep the task order
+    :param pool: multiprocessing Pool
+    :param func: function to apply
+    :param tasks: iterable of task arguments
+    :param max_in_flight: int
+    :return: generator of results
+    """
+    in_flight = deque()
+    for task in tasks:
+        in_flight.append(pool.apply_async(func, (task,)))
+        if len(in_flight) >= max_in_flight:
+            yield in_flight.popleft().get()
+    while in_flight:
+        yield in_flight.popleft().get()
+
+
+def iter_code_switch_posts(country, translation=True, pool=None, processes=1, chunk_size=CHUNK_SIZE,
+                           use_index=False):
+    """
+    Generator of the code switch posts of a country, one batch per chunk of the dump
+    :param country: str country to find code switching posts in
+    :param translation: bool
+        if we should remove translation posts
+    :param pool: multiprocessing Pool whose workers were initialized with load_models;
+        if None, the dump is processed in the current process
+    :param processes: int
+        number of workers in the pool, bounds the number of chunks in flight
+    :param chunk_size: int
+        number of dump lines per unit of work
+    :param use_index: bool
+        build (or update) the line index of an uncompressed dump and send workers byte ranges
+        to read themselves, instead of reading and sending them the lines
+    :return: generator of PostBatch
+        code switch posts, in dump order
+    """
+    input_folder = Path(INPUT_FOLDER)
+    final_file = find_dump(input_folder / f"{country}.comment.json.out")  # plain, .gz or .zst
+
+    with open_dump(final_file) as posts:
+        if use_index and compression_of(final_file) is None:
+            index = DumpIndex.build(final_file)
+            tasks = ((country, (str(final_file), start, end), translation)
+                     for start, end in index.byte_ranges(chunk_size))
+        else:
+            tasks = ((country, chunk, translation) for chunk in iter_chunks(posts, chunk_size))
+        if pool is None:
+            if nlp is None:
+                load_models()
+            results = map(process_chunk, tasks)
+        else:
+            results = ordered_imap(pool, process_chunk, tasks, 2 * processes)
+        for chunk_comments, stats in results:
+            filter_stats.merge(stats)
+            yield chunk_comments
 
     print(country, "done")
+
+
+def code_switch_polyglot(country, translation=True, pool=None, processes=1, chunk_size=CHUNK_SIZE, use_index=False):
+    """
+    Function to find code switch posts given a country
+    :param translation: bool
+        if we should remove translation posts
+    :param country: str country to find code switching posts in
+    :param pool: multiprocessing Pool, see iter_code_switch_posts
+    :param processes: int
+        number of workers in the pool
+    :param chunk_size: int
+        number of dump lines per unit of work
+    :param use_index: bool
+        read the dump through its line index, see iter_code_switch_posts
+    :return: PostBatch
+        the code switch posts in dump order, iterating it gives Post objects
+    """
+    comments = PostBatch()
+    for chunk_comments in iter_code_switch_posts(country, translation, pool, processes, chunk_size, use_index):
+        comments.extend(chunk_comments)
     return comments
 
 
-def find_langs(raw_text, translation=True):
+def csv_writer(fout):
     """
+    :param fout: text file opened with newline=''
+    :return: csv writer producing the same format as pandas.DataFrame.to_csv
+    """
+    return csv.writer(fout, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL, lineterminator='\n')
+
 
+def write_code_switch_csv(countries, shards_folder, merged_file=None, translation=True, pool=None, processes=1,
+                          chunk_size=CHUNK_SIZE, use_index=False):
+    """
+    Stream the code switch posts of the given countries to per-country CSV shards
+    (<shards_folder>/<country>_codeswitch.csv) and, optionally, to a single merged CSV;
+    rows are written as chunks are processed, so memory does not grow with the corpus
+    :param countries: list of countries to process
+    :param shards_folder: folder for the per-country shards, None to write the merged file only
+    :param merged_file: location of the merged CSV, None to write shards only
     :param translation: bool
         if we should remove translation posts
+    :param pool: multiprocessing Pool, see iter_code_switch_posts
+    :param processes: int
+        number of workers in the pool
+    :param chunk_size: int
+        number of dump lines per unit of work
+    :param use_index: bool
+        read the dumps through their line indexes, see iter_code_switch_posts
+    :return: dict
+        country to the number of written posts
+    """
+    counts = {}
+    header = Post.header()
+    merged = open(merged_file, 'w', encoding='utf-8', newline='') if merged_file is not None else None
+    try:
+        if merged is not None:
+            merged_writer = csv_writer(merged)
+            merged_writer.writerow(header)
+        for country in countries:
+            counts[country] = 0
+            shard = None
+            if shards_folder is not None:
+                shard = open(Path(shards_folder) / f"{country}_codeswitch.csv", 'w', encoding='utf-8', newline='')
+            try:
+                if shard is not None:
+                    shard_writer = csv_writer(shard)
+                    shard_writer.writerow(header)
+                for chunk_comments in iter_code_switch_posts(country, translation, pool, processes, chunk_size,
+                                                             use_index):
+                    if shard is not None:
+                        shard_writer.writerows(chunk_comments.rows())
+                    if merged is not None:
+                        merged_writer.writerows(chunk_comments.rows())
+                    counts[country] += len(chunk_comments)
+            finally:
+                if shard is not None:
+                    shard.close()
+    finally:
+        if merged is not None:
+            merged.close()
+    return counts
+
+
+def has_non_english_signal(raw_text):
+    """
+    Cheap check for any sign of a language other than English: a non-ASCII letter,
+    or a word missing from the english word list
     :param raw_text: the raw text from the subreddit
+    :return: bool
+    """
+    if not raw_text.isascii():
+        for char in raw_text:
+            if ord(char) > 127 and char.isalpha():
+                return True
+    for word in ascii_word.findall(raw_text.lower()):
+        if word not in english_words:
+            return True
+    return False
+
+
+def find_langs(raw_text, translation=True, stats=None):
+    """
+    Filter cascade from the cheapest to the most expensive stage: links, translation words,
+    non-English signal, cleaning (NER) and language detection
+    :param translation: bool
+        if we should remove translation posts
+    :param raw_text: the raw text from the subreddit
+    :param stats: FilterStats to record the stages in, if any
     :return: tuple
         if post is not codeswitch post then return None,
         else return lang1, lang2 and confidence of lang1 in post
     """
-    global false_langs
-    if "http" in raw_text:
+    stats = stats if stats is not None else FilterStats()
+    if not prefilter(raw_text, translation, stats):
         return None
-        # skip posts that have links (these posts are too noisy and hard to built regex to remove the links)
+    started = time.perf_counter()
     clean_string = clean_text(raw_text)
-    if translation:
-        if is_translation(clean_string):
-            return None
+    stats.seconds["clean"] += time.perf_counter() - started
+    return postfilter(clean_string, translation, stats)[0]
+
+
+def prefilter(raw_text, translation, stats):
+    """
+    The cheap stages of the cascade, run on the raw text
+    :param raw_text: the raw text from the subreddit
+    :param translation: bool
+        if we should remove translation posts
+    :param stats: FilterStats to record the stages in
+    :return: bool
+        True if the post should go on to cleaning and detection
+    """
+    started = time.perf_counter()
+    if stats.record("url", "http" in raw_text, started):
+        return False
+        # skip posts that have links (these posts are too noisy and hard to built regex to remove the links)
 
+    started = time.perf_counter()
+    if translation and stats.record("translation", is_translation(raw_text), started):
+        return False
+
+    started = time.perf_counter()
+    if stats.record("signal", not has_non_english_signal(raw_text), started):
+        # plain English posts can not be code switched
+        return False
+    return True
+
+
+def postfilter(clean_string, translation, stats, detection=None):
+    """
+    The stages of the cascade run on the cleaned text; the time of cleaning itself
+    is accounted for by the caller, which may clean posts in batches
+    :param clean_string: str cleaned post text
+    :param translation: bool
+        if we should remove translation posts
+    :param stats: FilterStats to record the stages in
+    :param detection: a cached result of run_detector for clean_string, if any
+    :return: tuple
+        (None or lang1, lang2 and confidence of lang1 in post, see find_langs;
+         the result of run_detector, None if the post was rejected before detection)
+    """
+    started = time.perf_counter()
+    if stats.record("clean", translation and is_translation(clean_string), started):
+        return None, detection
+
+    started = time.perf_counter()
+    if detection is None:
+        detection = run_detector(clean_string)
+    langs = select_langs(detection)
+    stats.record("detect", langs is None, started)
+    return langs, detection
+
+
+def run_detector(clean_string):
+    """
+    :param clean_string: str cleaned post text
+    :return: tuple
+        (((code, name, confidence) of the top 3 languages), reliable)
+    """
     detector = Detector(clean_string, quiet=True)
-    if ("en" != detector.languages[0].code) and ("en" != detector.languages[1].code):
+    languages = tuple((language.code, language.name, language.confidence) for language in detector.languages)
+    return languages, detector.reliable
+
+
+def select_langs(detection):
+    """
+    :param detection: tuple as returned by run_detector
+    :return: tuple
+        if post is not codeswitch post then return None,
+        else return lang1, lang2 and confidence of lang1 in post
+    """
+    languages, reliable = detection
+    (code1, name1, _), (code2, name2, confidence2) = languages[0], languages[1]
+    if ("en" != code1) and ("en" != code2):
         # skip posts that don't contain any english
         return None
 
-    if (detector.languages[1].code not in false_langs) and (detector.languages[0].code not in false_langs):
-        if detector.reliable:
-            lang1 = detector.languages[0].name
-            lang2 = detector.languages[1].name
-            confidence = detector.languages[1].confidence
+    if (code2 not in false_langs) and (code1 not in false_langs):
+        if reliable:
+            lang1 = name1
+            lang2 = name2
+            confidence = confidence2
 
             return lang1, lang2, confidence
         else:
@@ -115,6 +495,16 @@ def find_langs(raw_text, translation=True):
         return None
 
 
+def detect_langs(clean_string):
+    """
+    :param clean_string: str cleaned post text
+    :return: tuple
+        if post is not codeswitch post then return None,
+        else return lang1, lang2 and confidence of lang1 in post
+    """
+    return select_langs(run_detector(clean_string))
+
+
 def clean_text(text):
     """
 
@@ -122,26 +512,43 @@ def clean_text(text):
     :return: str
         return cleaned string
     """
-    new_string = re.sub('&gt;.*', ' ', text)  # remove replies to
-    new_string = re.sub('&.*;', ' ', new_string)  # remove replied to
-    new_string = re.sub('r/.*\s', ' ', new_string)  # remove any subreddit links
-    new_string = re.sub('u/.*\s', " ", new_string)  # remove user names
-    new_string = ''.join(z for z in new_string if z.isprintable())
+    return next(clean_texts([text], n_process=1))  # a single text is not worth starting nlp.pipe processes
 
-    string_list = re.findall('\".*\"', new_string)
 
-    # remove quotes that are longer than 5 words in length
-    for string in string_list:
-        token_count = len(string.split())
-        if token_count > 5:
-            new_string = new_string.replace(string, " ")
+def clean_texts(texts, batch_size=None, n_process=None):
+    """
+    Clean a batch of texts, running NER over all of them with nlp.pipe
+    :param texts: iterable of str raw texts to be cleaned
+    :param batch_size: int
+        texts per nlp.pipe batch, ner_batch_size by default
+    :param n_process: int
+        number of nlp.pipe processes, ner_processes by default
+    :return: generator of str
+        cleaned strings, in the order of texts
+    """
+    if nlp is None:
+        load_models()
+    sanitized = (sanitize_text(text) for text in texts)
+    docs = nlp.pipe(sanitized, batch_size=batch_size or ner_batch_size, n_process=n_process or ner_processes)
+    for doc in docs:
+        yield remove_entities(doc.text, doc.ents)
 
-    # remove named entities
-    doc = nlp(new_string)
-    for ent in doc.ents:
-        new_string = new_string.replace(ent.text, " ")
 
-    return new_string
+def remove_entities(text, ents):
+    """
+    Replace named entities by a space, in a single pass over their character offsets
+    :param text: str
+    :param ents: spaCy entity spans of text, in order
+    :return: str
+    """
+    pieces = []
+    prev_end = 0
+    for ent in ents:
+        pieces.append(text[prev_end:ent.start_char])
+        pieces.append(" ")
+        prev_end = ent.end_char
+    pieces.append(text[prev_end:])
+    return "".join(pieces)
 
 
 def is_translation(text):
@@ -152,28 +559,30 @@ def is_translation(text):
 
     :return: bool
     """
-    if text == "":
-        return True
-    post_lst = text.lower().split()
-    all_words = [x for x in post_lst]
-    for word in all_words:
-        if word in translation_words:
-            return True
-    else:
-        return False
+    return translation_matcher.matches(text)
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='extracts code switch posts from the crawled country subreddits')
+    parser.add_argument('--processes', type=int, default=mp.cpu_count(), help='number of worker processes')
+    parser.add_argument('--chunk_size', type=int, default=CHUNK_SIZE, help='dump lines per unit of work')
+    parser.add_argument('--gpu', action='store_true', help='run spaCy NER on the GPU')
+    parser.add_argument('--ner_batch_size', type=int, default=NER_BATCH_SIZE, help='texts per nlp.pipe batch')
+    parser.add_argument('--use_index', action='store_true',
+                        help='index uncompressed dumps and let workers read their own byte ranges')
+    parser.add_argument('--cache', default=None, help='SQLite file caching cleaned texts and detections across runs')
+    parser.add_argument('--shards_folder', default=None, help='also write a <country>_codeswitch.csv per country')
+    args = parser.parse_args()
+
     data_folder = Path("/ais/hal9000/masih/codeswitch/final_cs/")
     out_file = data_folder / "netherlands_codeswitch.csv"
     eng_countries = ["Canada", "US", "Australia", "UK", "NewZealand"]
-    pool = mp.Pool(1)  # specify how many cores to use
     countries = np.loadtxt("countries.txt", usecols=0, dtype="str")
     valid_countries = [x for x in countries if x not in eng_countries]
-    results = pool.map(code_switch_polyglot, valid_countries) # if you want to use multiprocessing
-    # results = [code_switch_polyglot(x) for x in valid_countries]
-    comments_array = [item for sublist in results for item in sublist]
-
-    header = Post.header()
-    comments_df = pd.DataFrame([x.to_tuple() for x in comments_array], columns=header)
-    pd.DataFrame.to_csv(comments_df, out_file, index=False, encoding='utf-8')
+    # every worker loads the models once; countries are processed one after another,
+    # each split into chunks of lines shared by all workers, and written out as they are processed
+    with mp.Pool(args.processes, initializer=load_models,
+                 initargs=(args.gpu, args.ner_batch_size, 1, args.cache)) as pool:
+        write_code_switch_csv(valid_countries, args.shards_folder, out_file, pool=pool, processes=args.processes,
+                              chunk_size=args.chunk_size, use_index=args.use_index)
+    print(filter_stats.report())
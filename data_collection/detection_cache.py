@@ -0,0 +1,77 @@
+import json
+import sqlite3
+import hashlib
+
+"""
+A persistent cache of the expensive part of code switch detection: the cleaned (NER) text and the
+polyglot detection of a comment, keyed by a hash of the raw comment text and the pipeline version
+"""
+
+MAX_QUERY_PARAMETERS = 500
+
+
+class DetectionCache:
+    """
+    SQLite-backed map: hash(pipeline version, raw text) -> (clean text, top-3 languages, reliable);
+    the detection may be missing (None) for posts rejected on their clean text before detection.
+    Every process opens its own connection; concurrent writers are serialized by SQLite (WAL mode)
+    """
+
+    def __init__(self, path, version):
+        """
+        :param path: location of the SQLite database, created if missing
+        :param version: str
+            pipeline version; entries of other versions are never returned
+        """
+        self.version = version
+        self.connection = sqlite3.connect(str(path), timeout=600)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS detections '
+                                '(key BLOB PRIMARY KEY, clean_text TEXT NOT NULL, languages TEXT, reliable INTEGER)')
+        self.connection.commit()
+
+    def key(self, raw_text):
+        """
+        :param raw_text: str the raw text of a comment
+        :return: bytes
+            16-byte hash of the pipeline version and the text
+        """
+        return hashlib.blake2b((self.version + '\0' + raw_text).encode('utf-8'), digest_size=16).digest()
+
+    def get_many(self, raw_texts):
+        """
+        :param raw_texts: list of raw comment texts
+        :return: list
+            for every text None if not cached, else a tuple (clean_text, detection) where detection
+            is None or a tuple (((code, name, confidence), ...top 3), reliable)
+        """
+        keys = [self.key(raw_text) for raw_text in raw_texts]
+        found = {}
+        for start in range(0, len(keys), MAX_QUERY_PARAMETERS):
+            batch = keys[start:start + MAX_QUERY_PARAMETERS]
+            query = 'SELECT key, clean_text, languages, reliable FROM detections WHERE key IN (' + \
+                    ','.join('?' * len(batch)) + ')'
+            for key, clean_text, languages, reliable in self.connection.execute(query, batch):
+                detection = None
+                if languages is not None:
+                    detection = (tuple(tuple(language) for language in json.loads(languages)), bool(reliable))
+                found[key] = (clean_text, detection)
+        return [found.get(key) for key in keys]
+
+    def put_many(self, entries):
+        """
+        :param entries: list of tuples (raw_text, clean_text, detection), detection as returned by get_many
+        """
+        rows = []
+        for raw_text, clean_text, detection in entries:
+            languages = reliable = None
+            if detection is not None:
+                languages = json.dumps(detection[0], ensure_ascii=False)
+                reliable = int(detection[1])
+            rows.append((self.key(raw_text), clean_text, languages, reliable))
+        with self.connection:
+            self.connection.executemany('INSERT OR REPLACE INTO detections VALUES (?, ?, ?, ?)', rows)
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,240 @@
+import os
+import sys
+import mmap
+import struct
+import hashlib
+import numpy as np
+from pathlib import Path
+
+from dump_io import compression_of, get_decoder
+
+"""
+Line index of an uncompressed JSONL dump, stored in a binary sidecar (<dump>.idx):
+the byte offset of every line and a sorted id -> line map, both memory-mapped when loaded
+"""
+
+MAGIC = b'CSIDX002'
+HEADER = struct.Struct('<8sQQQ16s')  # magic, indexed bytes, number of lines, number of ids, fingerprint
+INDEX_SUFFIX = '.idx'
+SCAN_BLOCK = 1 << 26  # bytes scanned for line breaks at a time
+
+
+def id_to_int(post_id):
+    """
+    :param post_id: str reddit base36 id, with or without a type prefix (e.g. 't1_')
+    :return: int
+    """
+    return int(post_id.rsplit('_', 1)[-1], 36)
+
+
+def read_range(dump_path, start, end):
+    """
+    read the lines of a byte range of a dump, e.g. a range returned by DumpIndex.byte_ranges
+    :param dump_path: location of the uncompressed dump
+    :param start: int
+        offset of the first line
+    :param end: int
+        offset after the last line
+    :return: list of str
+        the lines, without line breaks
+    """
+    with open(dump_path, 'rb') as fin:
+        fin.seek(start)
+        data = fin.read(end - start)
+    # str.splitlines would also split on unicode line separators inside the records
+    return data.decode('utf-8').split('\n')[:-1]
+
+
+def fingerprint(dump_path, offsets):
+    """
+    :param dump_path: location of the uncompressed dump
+    :param offsets: line offsets of the indexed part of the dump
+    :return: bytes
+        hash of the first and the last indexed lines (with their line breaks): a dump that was rewritten
+        rather than appended to, even into a file no smaller, no longer matches it
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    if len(offsets) > 1:
+        with open(dump_path, 'rb') as fin:
+            for start, end in [(offsets[0], offsets[1]), (offsets[-2], offsets[-1])]:
+                fin.seek(int(start))
+                digest.update(fin.read(int(end) - int(start)))
+    return digest.digest()
+
+
+class DumpIndex:
+    """
+    offsets[i] is the byte offset of line i, offsets[n_lines] the number of indexed bytes;
+    ids holds the sorted integer ids of the records and id_lines their line numbers
+    """
+
+    def __init__(self, dump_path, offsets, ids, id_lines, fingerprint=b''):
+        self.dump_path = Path(dump_path)
+        self.offsets = offsets
+        self.ids = ids
+        self.id_lines = id_lines
+        self.fingerprint = fingerprint
+        self.dump = None
+
+    @staticmethod
+    def index_path(dump_path):
+        return Path(str(dump_path) + INDEX_SUFFIX)
+
+    @classmethod
+    def load(cls, dump_path):
+        """
+        memory-map the sidecar index of a dump
+        :param dump_path: location of the uncompressed dump
+        :return: DumpIndex
+        """
+        index_path = cls.index_path(dump_path)
+        with open(index_path, 'rb') as fin:
+            header = fin.read(HEADER.size)
+        if len(header) < HEADER.size or header[:len(MAGIC)] != MAGIC:
+            raise ValueError(str(index_path) + ' is not a dump index')
+        magic, indexed_bytes, n_lines, n_ids, stored_fingerprint = HEADER.unpack(header)
+        offset = HEADER.size
+        offsets = np.memmap(index_path, dtype='<u8', mode='r', offset=offset, shape=(n_lines + 1,))
+        offset += 8 * (n_lines + 1)
+        ids = np.memmap(index_path, dtype='<u8', mode='r', offset=offset, shape=(n_ids,)) if n_ids else \
+            np.zeros(0, dtype='<u8')
+        offset += 8 * n_ids
+        id_lines = np.memmap(index_path, dtype='<u8', mode='r', offset=offset, shape=(n_ids,)) if n_ids else \
+            np.zeros(0, dtype='<u8')
+        return cls(dump_path, offsets, ids, id_lines, stored_fingerprint)
+
+    @classmethod
+    def build(cls, dump_path, decoder='auto'):
+        """
+        build, or incrementally extend, the index of a dump and store it next to the dump;
+        only the bytes appended since the last build are scanned; a dump that shrank or was rewritten
+        (its first or last indexed line changed, see fingerprint) is indexed anew
+        :param dump_path: location of the uncompressed dump
+        :param decoder: JSON decoder name, see dump_io.get_decoder
+        :return: DumpIndex
+        """
+        if compression_of(dump_path) is not None:
+            raise ValueError('only uncompressed dumps can be indexed: ' + str(dump_path))
+        size = os.path.getsize(dump_path)
+        offsets = np.zeros(1, dtype='<u8')
+        ids = id_lines = np.zeros(0, dtype='<u8')
+        index = None
+        if cls.index_path(dump_path).exists():
+            try:
+                index = cls.load(dump_path)
+            except ValueError:
+                pass  # an index of an older format
+        if index is not None and int(index.offsets[-1]) <= size and \
+                index.fingerprint == fingerprint(dump_path, index.offsets):
+            offsets, ids, id_lines = np.array(index.offsets), np.array(index.ids), np.array(index.id_lines)
+            del index
+            if int(offsets[-1]) == size:
+                return cls.load(dump_path)
+        else:
+            del index
+            if size == 0:
+                # nothing to scan (and an empty file cannot be memory-mapped)
+                cls.save(dump_path, offsets, ids, id_lines)
+                return cls.load(dump_path)
+        start = int(offsets[-1])
+
+        # line breaks of the new bytes, found block by block on the memory-mapped dump
+        new_offsets = []
+        with open(dump_path, 'rb') as fin, mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ) as dump:
+            for block_start in range(start, size, SCAN_BLOCK):
+                block = np.frombuffer(dump, dtype=np.uint8, count=min(SCAN_BLOCK, size - block_start),
+                                      offset=block_start)
+                new_offsets.append(np.flatnonzero(block == ord('\n')).astype('<u8') + (block_start + 1))
+                del block
+            new_offsets = np.concatenate(new_offsets) if new_offsets else np.zeros(0, dtype='<u8')
+
+            # ids of the new lines (a trailing line without a line break is left for the next build)
+            decode = get_decoder(decoder, projection=True)
+            first_line = len(offsets) - 1
+            line_starts = np.concatenate([[start], new_offsets[:-1]]).astype('<u8')
+            new_ids = []
+            new_id_lines = []
+            for i, (line_start, line_end) in enumerate(zip(line_starts, new_offsets)):
+                line = dump[int(line_start):int(line_end)]
+                try:
+                    new_ids.append(id_to_int(decode(line)['id']))
+                except (ValueError, KeyError):
+                    continue  # blank or broken line
+                new_id_lines.append(first_line + i)
+
+        offsets = np.concatenate([offsets, new_offsets])
+        ids = np.concatenate([ids, np.array(new_ids, dtype='<u8')])
+        id_lines = np.concatenate([id_lines, np.array(new_id_lines, dtype='<u8')])
+        order = np.argsort(ids, kind='stable')
+        cls.save(dump_path, offsets, ids[order], id_lines[order])
+        return cls.load(dump_path)
+
+    @classmethod
+    def save(cls, dump_path, offsets, ids, id_lines):
+        index_path = cls.index_path(dump_path)
+        tmp_path = Path(str(index_path) + '.tmp')
+        with open(tmp_path, 'wb') as fout:
+            fout.write(HEADER.pack(MAGIC, int(offsets[-1]), len(offsets) - 1, len(ids),
+                                   fingerprint(dump_path, offsets)))
+            for array in [offsets, ids, id_lines]:
+                fout.write(np.ascontiguousarray(array, dtype='<u8').tobytes())
+        os.replace(tmp_path, index_path)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def line(self, i):
+        """
+        :param i: int
+            line number
+        :return: bytes
+            the i-th line of the dump, without the line break
+        """
+        if self.dump is None:
+            with open(self.dump_path, 'rb') as fin:
+                self.dump = mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.dump[int(self.offsets[i]):int(self.offsets[i + 1]) - 1]
+
+    def find(self, post_id):
+        """
+        :param post_id: str reddit id, with or without a type prefix
+        :return: int
+            line number of the record with that id, None if not indexed
+        """
+        key = id_to_int(post_id)
+        position = int(np.searchsorted(self.ids, key))
+        if position < len(self.ids) and int(self.ids[position]) == key:
+            return int(self.id_lines[position])
+        return None
+
+    def get(self, post_id, decoder='auto'):
+        """
+        :param post_id: str reddit id, with or without a type prefix (so parent_id values work as well)
+        :param decoder: JSON decoder name, see dump_io.get_decoder
+        :return: dict
+            the record with that id, None if not indexed
+        """
+        i = self.find(post_id)
+        return None if i is None else get_decoder(decoder)(self.line(i))
+
+    def byte_ranges(self, lines_per_range):
+        """
+        split the indexed part of the dump into ranges of whole lines, e.g. units of work for read_range
+        :param lines_per_range: int
+        :return: list of (start, end) byte offsets
+        """
+        bounds = [int(offset) for offset in self.offsets[::lines_per_range]]
+        if bounds[-1] != int(self.offsets[-1]):
+            bounds.append(int(self.offsets[-1]))
+        return list(zip(bounds[:-1], bounds[1:]))
+
+    def close(self):
+        if self.dump is not None:
+            self.dump.close()
+            self.dump = None
+
+
+if __name__ == '__main__':
+    for dump_path in sys.argv[1:]:
+        index = DumpIndex.build(dump_path)
+        print(dump_path, len(index), 'lines', len(index.ids), 'ids')
@@ -0,0 +1,306 @@
+import io
+import os
+import gzip
+import json
+import sys
+import time
+import random
+from pathlib import Path
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
+
+"""
+Reading and writing of the raw JSONL dumps (<subreddit>.<type>.json.out), plain or compressed
+"""
+
+COMPRESSION_SUFFIXES = {None: '', 'gzip': '.gz', 'zstd': '.zst'}
+# the only fields of a dump record used by the extraction
+PROJECTED_FIELDS = ('subreddit', 'author', 'created_utc', 'id', 'link_id', 'parent_id', 'body', 'selftext')
+MISSING = object()
+
+
+def compression_of(path):
+    """
+    :param path: dump file location
+    :return: str
+        the compression of the file according to its suffix: None, 'gzip' or 'zstd'
+    """
+    for compression, suffix in COMPRESSION_SUFFIXES.items():
+        if compression is not None and str(path).endswith(suffix):
+            return compression
+    return None
+
+
+def dump_path(path, compression=None):
+    """
+    :param path: location of the uncompressed dump
+    :param compression: None, 'gzip' or 'zstd'
+    :return: Path
+        location of the dump with the given compression
+    """
+    assert (compression in COMPRESSION_SUFFIXES)
+    return Path(str(path) + COMPRESSION_SUFFIXES[compression])
+
+
+def find_dump(path):
+    """
+    find an existing dump, whichever compression it was written with
+    :param path: location of the uncompressed dump
+    :return: Path
+        the first existing of path, path.gz and path.zst
+    """
+    for compression in COMPRESSION_SUFFIXES:
+        candidate = dump_path(path, compression)
+        if candidate.exists():
+            return candidate
+    raise FileNotFoundError(path)
+
+
+def open_dump(path):
+    """
+    open a dump for reading text lines, decompressing it transparently;
+    compressed dumps may consist of several concatenated gzip members or zstd frames
+    :param path: dump file location
+    :return: text file object
+    """
+    compression = compression_of(path)
+    if compression == 'gzip':
+        return gzip.open(path, 'rt', encoding='utf-8')
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ImportError('reading ' + str(path) + ' requires the zstandard package')
+        reader = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), read_across_frames=True,
+                                                            closefd=True)
+        return io.TextIOWrapper(reader, encoding='utf-8')
+    return open(path, 'r', encoding='utf-8')
+
+
+class BufferedJsonWriter:
+    """
+    A buffered JSONL writer: records are serialized into memory and written out on flush(),
+    or once the buffer exceeds a size or an age threshold. With compression, every flush is
+    written as a self-contained gzip member / zstd frame, so the file is valid after each flush
+    and can be cut back to any flushed size (see tell()) and appended to
+    """
+
+    def __init__(self, path, mode='w', compression=None, max_bytes=1 << 22, max_seconds=30.0):
+        """
+        :param path: output file location (the compression suffix is not added)
+        :param mode: 'w' to create a new file, 'a' to append to an existing one
+        :param compression: None, 'gzip' or 'zstd'
+        :param max_bytes: int
+            flush once that many serialized bytes are buffered
+        :param max_seconds: float
+            flush once the oldest buffered record is that old
+        """
+        assert (mode in ['w', 'a'])
+        assert (compression in COMPRESSION_SUFFIXES)
+        if compression == 'zstd' and zstandard is None:
+            raise ImportError('zstd compression requires the zstandard package')
+        self.compression = compression
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.compressor = zstandard.ZstdCompressor() if compression == 'zstd' else None
+        self.fout = open(path, mode + 'b')
+        self.buffer = []
+        self.buffered_bytes = 0
+        self.buffered_since = None
+
+    def write(self, element):
+        """
+        buffer a single record
+        :param element: json-serializable object
+        """
+        line = (json.dumps(element) + '\n').encode('utf-8')
+        self.buffer.append(line)
+        self.buffered_bytes += len(line)
+        if self.buffered_since is None:
+            self.buffered_since = time.monotonic()
+        if self.buffered_bytes >= self.max_bytes or time.monotonic() - self.buffered_since >= self.max_seconds:
+            self.flush()
+
+    def flush(self):
+        """
+        write all buffered records to the file with a single write call
+        """
+        if self.buffer:
+            data = b''.join(self.buffer)
+            if self.compression == 'gzip':
+                data = gzip.compress(data)
+            elif self.compression == 'zstd':
+                data = self.compressor.compress(data)
+            self.fout.write(data)
+            self.fout.flush()
+        self.buffer = []
+        self.buffered_bytes = 0
+        self.buffered_since = None
+
+    def tell(self):
+        """
+        :return: int
+            size of the file up to the last flush
+        """
+        return self.fout.tell()
+
+    def close(self):
+        self.flush()
+        self.fout.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def truncate_dump(path, size):
+    """
+    cut a dump back to a previously flushed size, dropping whatever a crash left behind
+    :param path: dump file location
+    :param size: int
+        the size to cut the file to
+    """
+    if os.path.getsize(path) > size:
+        with open(path, 'rb+') as fout:
+            fout.truncate(size)
+
+
+def available_decoders():
+    """
+    :return: list
+        names of the JSON decoders installed, fastest first (as measured by benchmark_decoders:
+        the simdjson bindings parse fastest, but pay for it on every field access); orjson and simdjson
+        reject some lines json accepts (e.g. lone surrogate escapes), get_decoder falls back to json on those
+    """
+    return [name for name, module in [('orjson', orjson), ('simdjson', simdjson), ('json', json)]
+            if module is not None]
+
+
+def get_decoder(name='auto', projection=False):
+    """
+    return a function decoding a dump line (str or bytes) into a dict
+    :param name: 'simdjson', 'orjson', 'json' or 'auto' for the fastest installed one;
+        lines that simdjson or orjson reject are decoded again with json, so every decoder accepts what json does
+    :param projection: bool
+        return only the PROJECTED_FIELDS present in the record; simdjson parses lazily and
+        materializes only these fields, the other decoders parse the whole record first,
+        so for them projection only makes the returned dicts smaller
+    :return: function
+    """
+    if name == 'auto':
+        name = available_decoders()[0]
+    if name == 'json':
+        return project(json.loads) if projection else json.loads
+    return with_fallback(fast_decoder(name, projection), project(json.loads) if projection else json.loads)
+
+
+def project(loads):
+    """
+    :param loads: function decoding a dump line into a dict
+    :return: function decoding a dump line into a dict of its PROJECTED_FIELDS
+    """
+    def decode(line):
+        data = loads(line)
+        return {field: data[field] for field in PROJECTED_FIELDS if field in data}
+    return decode
+
+
+def with_fallback(decode, fallback):
+    """
+    :param decode: function decoding a dump line, raising ValueError on lines it rejects
+    :param fallback: function decoding the rejected lines (a ValueError of it propagates)
+    :return: function
+    """
+    def decode_or_fall_back(line):
+        try:
+            return decode(line)
+        except ValueError:
+            return fallback(line)
+    return decode_or_fall_back
+
+
+def fast_decoder(name, projection):
+    """
+    :param name: 'simdjson' or 'orjson'
+    :param projection: bool, see get_decoder
+    :return: function decoding a dump line into a dict, without falling back to json
+    """
+    if name == 'simdjson':
+        if simdjson is None:
+            raise ImportError('the simdjson decoder requires the pysimdjson package')
+        parser = simdjson.Parser()  # reused for every line; documents are copied out before the next parse
+
+        def decode(line):
+            document = parser.parse(line.encode('utf-8') if isinstance(line, str) else line)
+            if projection:
+                return {field: value for field in PROJECTED_FIELDS
+                        if (value := document.get(field, MISSING)) is not MISSING}
+            return document.as_dict()
+        return decode
+    if name == 'orjson':
+        if orjson is None:
+            raise ImportError('the orjson decoder requires the orjson package')
+        return project(orjson.loads) if projection else orjson.loads
+    raise ValueError('unknown decoder: ' + name)
+
+
+def synthetic_record(rng, i):
+    """
+    :param rng: random.Random
+    :param i: int
+        record number
+    :return: dict
+        a comment record with the shape and the fields of a pushshift comment
+    """
+    words = ['the', 'and', 'salamat', 'talaga', 'είναι', 'это', 'bine', 'tidak', 'really', 'country']
+    return {
+        'all_awardings': [], 'associated_award': None, 'author': 'user' + str(rng.randint(0, 100000)),
+        'author_flair_background_color': None, 'author_flair_css_class': None, 'author_flair_richtext': [],
+        'author_flair_template_id': None, 'author_flair_text': None, 'author_flair_text_color': None,
+        'author_flair_type': 'text', 'author_fullname': 't2_' + format(rng.randint(0, 1 << 30), 'x'),
+        'author_patreon_flair': False, 'author_premium': False, 'awarders': [],
+        'body': ' '.join(rng.choice(words) for _ in range(rng.randint(5, 80))), 'collapsed_because_crowd_control': None,
+        'created_utc': 1500000000 + i, 'gildings': {}, 'id': format(i, 'x'), 'is_submitter': False,
+        'link_id': 't3_' + format(i // 50, 'x'), 'locked': False, 'no_follow': True,
+        'parent_id': 't1_' + format(max(0, i - 1), 'x'), 'permalink': '/r/Philippines/comments/' + format(i, 'x'),
+        'retrieved_on': 1600000000 + i, 'score': rng.randint(-5, 100), 'send_replies': True, 'stickied': False,
+        'subreddit': 'Philippines', 'subreddit_id': 't5_2qjov', 'top_awarded_type': None,
+        'total_awards_received': 0, 'treatment_tags': [],
+    }
+
+
+def benchmark_decoders(n_lines=100000, seed=0):
+    """
+    print lines/sec of every installed decoder, with and without projection, over a synthetic dump
+    :param n_lines: int
+        number of synthetic dump lines
+    :param seed: int
+    """
+    rng = random.Random(seed)
+    lines = [json.dumps(synthetic_record(rng, i)) + '\n' for i in range(n_lines)]
+    for name in available_decoders():
+        for projection in [False, True]:
+            decode = get_decoder(name, projection)
+            started = time.perf_counter()
+            for line in lines:
+                decode(line)
+            seconds = time.perf_counter() - started
+            print('{0:<10}{1:<14}{2:>12,.0f} lines/sec'.format(name, 'projection' if projection else 'full',
+                                                               n_lines / seconds))
+
+
+if __name__ == '__main__':
+    benchmark_decoders(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -1,8 +1,24 @@
+import sys
+import random
+import tracemalloc
+from array import array
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+
 class Post:
     """
     A class for posts
 
     """
+    __slots__ = ('author', 'sub_reddit', 'text', 'lang1', 'lang2', 'date', 'country', 'confidence', 'id',
+                 'link_id', 'parent_id')
 
     def __init__(self, author, sub_reddit, date, country, confidence, text, lang1, lang2, id, link_id, parent_id):
         """
@@ -53,3 +69,165 @@ class Post:
         return (
             'Author', "Subreddit", "Country", "Date", "confidence", "Lang1", "Lang2", "Text", "id", "link_id",
             "parent_id")
+
+
+class PostBatch:
+    """
+    A columnar container of posts: typed arrays for date and confidence, interned strings for the
+    few-valued columns (subreddit, country, languages) and plain lists for the rest; converts to a
+    DataFrame or an Arrow table column by column, without building a tuple per row
+    """
+    COLUMNS = ('author', 'sub_reddit', 'country', 'date', 'confidence', 'lang1', 'lang2', 'text', 'id',
+               'link_id', 'parent_id')  # in Post.to_tuple / Post.header order
+    INTERNED = ('sub_reddit', 'country', 'lang1', 'lang2')
+
+    def __init__(self):
+        self.author = []
+        self.sub_reddit = []
+        self.country = []
+        self.date = array('q')
+        self.confidence = array('d')
+        self.lang1 = []
+        self.lang2 = []
+        self.text = []
+        self.id = []
+        self.link_id = []
+        self.parent_id = []
+
+    @classmethod
+    def from_posts(cls, posts):
+        """
+        :param posts: iterable of Post objects
+        :return: PostBatch
+        """
+        batch = cls()
+        batch.extend(posts)
+        return batch
+
+    def append(self, post):
+        """
+        :param post: Post object
+        """
+        self.add(post.author, post.sub_reddit, post.date, post.country, post.confidence, post.text, post.lang1,
+                 post.lang2, post.id, post.link_id, post.parent_id)
+
+    def add(self, author, sub_reddit, date, country, confidence, text, lang1, lang2, id, link_id, parent_id):
+        """
+        append a post given its fields, in the order of the Post constructor
+        """
+        self.author.append(author)
+        self.sub_reddit.append(sys.intern(sub_reddit))
+        self.country.append(sys.intern(country))
+        self.date.append(int(date))
+        self.confidence.append(confidence)
+        self.lang1.append(sys.intern(lang1))
+        self.lang2.append(sys.intern(lang2))
+        self.text.append(text)
+        self.id.append(id)
+        self.link_id.append(link_id)
+        self.parent_id.append(parent_id)
+
+    def extend(self, posts):
+        """
+        :param posts: iterable of Post objects or another PostBatch
+        """
+        if isinstance(posts, PostBatch):
+            for column in self.COLUMNS:
+                getattr(self, column).extend(getattr(posts, column))
+        else:
+            for post in posts:
+                self.append(post)
+
+    def __len__(self):
+        return len(self.date)
+
+    def __iter__(self):
+        """
+        :return: iterator of Post objects
+        """
+        for (author, sub_reddit, country, date, confidence, lang1, lang2, text, id, link_id,
+             parent_id) in self.rows():
+            yield Post(author, sub_reddit, date, country, confidence, text, lang1, lang2, id, link_id, parent_id)
+
+    def rows(self):
+        """
+        :return: iterator of tuples in Post.to_tuple order, e.g. for csv.writer.writerows
+        """
+        return zip(*(getattr(self, column) for column in self.COLUMNS))
+
+    def columns(self):
+        """
+        :return: dict
+            Post.header name to column, the typed columns as numpy arrays; these are copies (one per column),
+            a view of the batch memory would keep the batch from growing while the view is alive
+        """
+        data = {}
+        for name, column in zip(Post.header(), self.COLUMNS):
+            values = getattr(self, column)
+            if isinstance(values, array):
+                values = np.array(values, dtype=np.int64 if values.typecode == 'q' else np.float64)
+            data[name] = values
+        return data
+
+    def to_dataframe(self):
+        """
+        :return: pandas.DataFrame with the Post.header columns
+        """
+        return pd.DataFrame(self.columns(), columns=list(Post.header()))
+
+    def to_arrow(self):
+        """
+        :return: pyarrow.Table with the Post.header columns, the few-valued ones dictionary-encoded
+        """
+        if pa is None:
+            raise ImportError('PostBatch.to_arrow requires the pyarrow package')
+        arrays = []
+        for column, values in zip(self.COLUMNS, self.columns().values()):
+            values = pa.array(values)
+            arrays.append(values.dictionary_encode() if column in self.INTERNED else values)
+        return pa.Table.from_arrays(arrays, names=list(Post.header()))
+
+
+def benchmark_memory(n=100000, seed=0):
+    """
+    print the memory taken by n posts stored as plain (__dict__) objects, as Post objects and as a PostBatch;
+    the post texts are shared by all representations and not counted, all other fields are
+    :param n: int
+        number of posts
+    :param seed: int
+    """
+
+    class DictPost:
+        def __init__(self, *fields):
+            (self.author, self.sub_reddit, self.date, self.country, self.confidence, self.text, self.lang1,
+             self.lang2, self.id, self.link_id, self.parent_id) = fields
+
+    countries = ['Philippines', 'Greece', 'Indonesia', 'Romania', 'Russia']
+    languages = ['English', 'Tagalog', 'Greek', 'Indonesian', 'Romanian', 'Russian']
+    texts = ['text of the post number ' + str(i) for i in range(n)]
+
+    def fresh(string):
+        return string[:1] + string[1:]
+
+    def records():
+        # new string objects for every post, as json.loads returns them
+        rng = random.Random(seed)
+        for i in range(n):
+            country = rng.choice(countries)
+            yield ('user' + str(rng.randint(0, n)), fresh(country), 1500000000 + i, fresh(country),
+                   float(rng.randint(5, 50)), texts[i], fresh(rng.choice(languages)), fresh(rng.choice(languages)),
+                   format(i, 'x'), 't3_' + format(i // 50, 'x'), 't1_' + format(i - 1, 'x'))
+
+    for name, build in [('dict object', lambda: [DictPost(*record) for record in records()]),
+                        ('Post (__slots__)', lambda: [Post(*record) for record in records()]),
+                        ('PostBatch', lambda: PostBatch.from_posts(Post(*record) for record in records()))]:
+        tracemalloc.start()
+        posts = build()
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print('{0:<18}{1:>8.1f} bytes/post'.format(name, float(size) / n))
+        del posts
+
+
+if __name__ == '__main__':
+    benchmark_memory(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
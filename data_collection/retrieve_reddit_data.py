@@ -1,11 +1,157 @@
-import sys
+import os
+import time
+import argparse
 import requests
 import datetime
 import json
+import random
+import threading
 import pandas as pd
 import spacy
 import multiprocessing as mp
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+from requests.adapters import HTTPAdapter
+from dump_io import BufferedJsonWriter, COMPRESSION_SUFFIXES, compression_of, dump_path, find_dump, open_dump, \
+    truncate_dump
+
+
+class RateLimiter:
+    """
+    A thread-safe limiter shared by all crawling workers: consecutive requests
+    are spaced at least 1/rate seconds apart, no matter which thread issues them
+    """
+
+    def __init__(self, rate=None):
+        """
+        :param rate: float
+            maximal number of requests per second, None (or 0) for no limit
+        """
+        self.interval = 1.0 / rate if rate else 0.0
+        self.next_slot = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        """
+        block the calling thread until it is allowed to issue its next request
+        """
+        if self.interval == 0.0:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        # end with
+        if slot > now:
+            time.sleep(slot - now)
+        # end if
+    # end def
+
+
+# end class
+
+
+class FetchError(Exception):
+    """
+    raised when a page could not be fetched within the allowed number of attempts
+    """
+    pass
+
+
+# end class
+
+
+class PushshiftClient:
+    """
+    A fetch layer over pushshift: keep-alive sessions with a connection pool (one session per
+    thread, as requests sessions are not thread-safe), per-request timeouts and exponential
+    backoff with jitter on 429/5xx responses, connection errors and truncated or malformed responses
+    """
+
+    def __init__(self, rate_limiter=None, pool_size=10, timeout=30, max_retries=5, backoff=1.0,
+                 max_backoff=60.0):
+        """
+        :param rate_limiter: RateLimiter applied to every attempt, shared by all threads
+        :param pool_size: int
+            maximal number of kept-alive connections per session
+        :param timeout: float
+            seconds to wait for connecting and for each read of the response
+        :param max_retries: int
+            number of retries of a failing request before giving up
+        :param backoff: float
+            base delay in seconds, doubled on every retry
+        :param max_backoff: float
+            cap of a single delay in seconds
+        """
+        self.rate_limiter = rate_limiter
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.local = threading.local()
+
+    def session(self):
+        """
+        :return: the keep-alive session of the calling thread
+        """
+        session = getattr(self.local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            self.local.session = session
+        # end if
+        return session
+
+    def delay(self, attempt, response=None):
+        """
+        :param attempt: 0-based index of the failed attempt
+        :param response: the failed response, if any
+        :return: seconds to sleep before the next attempt (a server's Retry-After is respected)
+        """
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after is not None and retry_after.isdigit():
+            return min(float(retry_after), self.max_backoff)
+        # end if
+        # "full jitter": a uniform delay up to the exponentially growing bound
+        return random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+
+    def fetch(self, query):
+        """
+        fetch a page of pushshift results
+        :param query: full query url
+        :return: list
+            the 'data' elements of the page, the response is parsed once
+        """
+        for attempt in range(self.max_retries + 1):
+            if self.rate_limiter is not None:
+                self.rate_limiter.wait()
+            # end if
+            response = None
+            try:
+                response = self.session().get(query, timeout=self.timeout)
+                if response.status_code == 200:
+                    return response.json()['data']
+                # end if
+                if response.status_code != 429 and response.status_code < 500:
+                    raise FetchError('bad response code: ' + str(response.status_code))
+                # end if
+                print('response code', response.status_code, 'attempt', attempt + 1, query)
+            except (requests.RequestException, ValueError) as exception:
+                # connection errors, timeouts, truncated transfers and bodies that are not valid JSON
+                print('request failed, attempt', attempt + 1, exception)
+            # end try
+            if attempt < self.max_retries:
+                time.sleep(self.delay(attempt, response))
+            # end if
+        # end for
+        raise FetchError('giving up after ' + str(self.max_retries + 1) + ' attempts: ' + query)
+    # end def
+
+
+# end class
 
 
 def has_text(element):
@@ -22,77 +168,292 @@ def has_text(element):
 # end def
 
 
-def crawl_subreddit_data(subreddit_name, retrieval_type='comment'):
+def read_cursor(out_file):
+    """
+    return the crawl cursor of an output file: the oldest and the newest crawled
+    created_utc and whether the backwards crawl reached the subreddit's first post;
+    the sidecar cursor file is used if present, otherwise the output file is scanned
+    :param out_file: Path of a <subreddit>.<type>.json.out file
+    :return: dict
+        {'oldest': int, 'newest': int, 'complete': bool, 'size': int}, None if nothing was crawled yet;
+        'size' is the file size after the last fully written page, missing for scanned files
+    """
+    cursor_file = Path(str(out_file) + CURSOR_SUFFIX)
+    if cursor_file.exists():
+        with open(cursor_file, 'r') as fin:
+            return json.load(fin)
+        # end with
+    # end if
+    if not Path(out_file).exists():
+        return None
+    # end if
+
+    oldest = newest = None
+    with open_dump(out_file) as fin:
+        try:
+            for line in fin:
+                try:
+                    created_utc = json.loads(line)['created_utc']
+                except (ValueError, KeyError):
+                    continue  # a partially written last line of a crashed crawl
+                # end try
+                oldest = created_utc if oldest is None else min(oldest, created_utc)
+                newest = created_utc if newest is None else max(newest, created_utc)
+            # end for
+        except (EOFError, OSError) as exception:
+            print(out_file, 'ends with a corrupted block:', exception)
+        # end try
+    # end with
+    if oldest is None:
+        return None
+    # end if
+    return {'oldest': oldest, 'newest': newest, 'complete': False}
+
+
+# end def
+
+
+def write_cursor(out_file, cursor):
+    """
+    atomically store the crawl cursor next to the output file
+    :param out_file: Path of a <subreddit>.<type>.json.out file
+    :param cursor: dict as returned by read_cursor
+    """
+    cursor_file = Path(str(out_file) + CURSOR_SUFFIX)
+    tmp_file = Path(str(cursor_file) + '.tmp')
+    with open(tmp_file, 'w') as fout:
+        json.dump(cursor, fout)
+    # end with
+    os.replace(tmp_file, cursor_file)
+
+
+# end def
+
+
+def truncate_partial_line(out_file):
+    """
+    drop a trailing line left incomplete by a crash, so that appending keeps the file valid JSONL
+    :param out_file: Path of a <subreddit>.<type>.json.out file
+    """
+    with open(out_file, 'rb+') as fout:
+        size = fout.seek(0, os.SEEK_END)
+        position = size
+        while position > 0:
+            step = min(CHUNK_SIZE, position)
+            fout.seek(position - step)
+            newline = fout.read(step).rfind(b'\n')
+            if newline >= 0:
+                position = position - step + newline + 1
+                break
+            # end if
+            position -= step
+        # end while
+        if position < size:
+            fout.truncate(position)
+        # end if
+    # end with
+
+
+# end def
+
+
+def crawl_subreddit_data(subreddit_name, retrieval_type='comment', out_folder=None, endpoint=None,
+                         rate_limiter=None, mode='full', client=None, compression=None):
     """
     crawl all posts (submissions or comments) for a given subreddit
     :param subreddit_name:
     :param retrieval_type:
-    :return:
+    :param out_folder: folder to write <subreddit>.<type>.json.out to, OUT_FOLDER by default
+    :param endpoint: pushshift search endpoint, PUSHSHIFT_ENDPOINT by default
+    :param rate_limiter: RateLimiter shared by concurrent crawlers, if any
+    :param mode: str
+        'full' - crawl from now backwards into a new file
+        'resume' - append to an existing file, continuing backwards from its oldest post
+        'update' - append to an existing file only posts newer than its newest post
+    :param client: PushshiftClient to fetch pages with, a new one (using rate_limiter) by default
+    :param compression: None, 'gzip' or 'zstd' to write <subreddit>.<type>.json.out[.gz|.zst];
+        'resume' and 'update' keep the compression of an existing file, whatever the argument
+    :return: the number of fetched pages
     """
+    assert (mode in CRAWL_MODES)
+    client = client or PushshiftClient(rate_limiter)
+    out_folder = Path(out_folder or OUT_FOLDER)
+    endpoint = endpoint or PUSHSHIFT_ENDPOINT
+    out_file = dump_path(out_folder / f"{subreddit_name}.{retrieval_type}.json.out", compression)
+    if mode != 'full' and not out_file.exists():
+        # a file crawled with another compression is continued as is rather than crawled anew
+        try:
+            existing = find_dump(out_folder / f"{subreddit_name}.{retrieval_type}.json.out")
+        except FileNotFoundError:
+            existing = None
+        # end try
+        if existing is not None:
+            compression = compression_of(existing)
+            print(subreddit_name, 'continuing', existing, 'with its compression:', compression)
+            out_file = existing
+        # end if
+    # end if
 
     today = datetime.datetime.utcnow()
     today_timestamp = int((today - datetime.datetime(1970, 1, 1)).total_seconds())
-    before_date = today_timestamp
-    previous_time = before_date
-    out_folder = Path(f"/ais/hal9000/masih/codeswitch/allposts/")
-    out_file = out_folder / f"{subreddit_name}.{retrieval_type}.json.out"
-    with open(out_file, 'w') as fout:
+    cursor = read_cursor(out_file) if mode != 'full' else None
+    if cursor is None:
+        mode = 'full'
+        cursor = {'oldest': today_timestamp, 'newest': None, 'complete': False}
+    # end if
+    if mode == 'resume' and cursor['complete']:
+        print(subreddit_name, 'already crawled')
+        return 0
+    # end if
+    if mode == 'update' and cursor['newest'] is None:
+        mode = 'resume'
+    # end if
+
+    # backwards paging (full, resume) moves 'before', forward paging (update) moves 'after'
+    if mode == 'update':
+        page_date = cursor['newest']
+        direction = '&sort=asc&after='
+    else:
+        page_date = cursor['oldest']
+        direction = '&sort=desc&before='
+    # end if
+    previous_time = page_date
+
+    if mode == 'full':
+        # the dump is emptied below: a cursor left by a previous crawl must not outlive it
+        cursor['size'] = 0
+        write_cursor(out_file, cursor)
+    else:
+        if 'size' in cursor:
+            truncate_dump(out_file, cursor['size'])
+        elif compression is None:
+            truncate_partial_line(out_file)
+        # end if
+    # end if
+    with BufferedJsonWriter(out_file, 'w' if mode == 'full' else 'a', compression) as fout:
         count = 0
         done = False
         while not done:
-            print(before_date)
+            print(page_date)
             count += 1
-            query = PUSHSHIFT_ENDPOINT + retrieval_type + '/?subreddit=' + subreddit_name + \
-                    '&sort=desc&size=' + str(MAX_RETRIEVED_ELEMENTS) + '&before=' + str(before_date)
+            query = endpoint + retrieval_type + '/?subreddit=' + subreddit_name + \
+                    '&size=' + str(MAX_RETRIEVED_ELEMENTS) + direction + str(page_date)
             print(query, 'request #', count)
 
-            r = requests.get(query)
-            if r.status_code is not 200:
-                print('bad response code:', r.status_code)
+            try:
+                data = client.fetch(query)
+            except FetchError as exception:
+                print(exception)  # the cursor keeps the progress, the crawl can be resumed
                 break
-
-            # end if
+            # end try
 
             # record the response
-            for element in r.json()['data']:
+            for element in data:
                 if has_text(element):
-                    json.dump(element, fout)
-                    fout.write('\n')
-                    fout.flush()
+                    fout.write(element)
                 # end if
 
-                before_date = element['created_utc']
+                page_date = element['created_utc']
+                if cursor['newest'] is None or page_date > cursor['newest']:
+                    cursor['newest'] = page_date
+                # end if
             # end for
 
-            # if len(r.json()['data']) < MAX_RETRIEVED_ELEMENTS:
-            if before_date == previous_time:
+            # if len(data) < MAX_RETRIEVED_ELEMENTS:
+            if page_date == previous_time:
                 done = True
+                if mode != 'update':
+                    cursor['complete'] = True
+                # end if
                 print("done")
             else:
-                previous_time = before_date
-        # end if
-    # end while
+                previous_time = page_date
+                if mode != 'update':
+                    cursor['oldest'] = page_date
+                # end if
+            # end if
+            # a page is recorded in full before the cursor moves past it
+            fout.flush()
+            cursor['size'] = fout.tell()
+            write_cursor(out_file, cursor)
+        # end while
+    # end with
+    return count
+
+
+# end def
+
+
+def crawl_subreddits(subreddits, retrieval_type='comment', workers=1, rate=None, out_folder=None, endpoint=None,
+                     mode='full', compression=None):
+    """
+    crawl a list of subreddits with up to `workers` subreddits in flight at a time;
+    all workers share a single rate limiter, each subreddit is written to its own file
+    :param subreddits: list of subreddit names
+    :param retrieval_type: 'submission' or 'comment'
+    :param workers: int
+        maximal number of subreddits crawled concurrently
+    :param rate: float
+        global limit of requests per second over all workers, None for no limit
+    :param out_folder: output folder, OUT_FOLDER by default
+    :param endpoint: pushshift search endpoint, PUSHSHIFT_ENDPOINT by default
+    :param mode: 'full', 'resume' or 'update', see crawl_subreddit_data
+    :param compression: None, 'gzip' or 'zstd', see crawl_subreddit_data
+    :return: dict
+        subreddit name to the number of fetched pages (None if the crawl raised)
+    """
+    rate_limiter = RateLimiter(rate)
+    client = PushshiftClient(rate_limiter, pool_size=max(1, workers))
+    requests_count = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {executor.submit(crawl_subreddit_data, subreddit_name, retrieval_type, out_folder, endpoint,
+                                   rate_limiter, mode, client, compression): subreddit_name for subreddit_name in subreddits}
+        for future in as_completed(futures):
+            subreddit_name = futures[future]
+            try:
+                requests_count[subreddit_name] = future.result()
+            except Exception as exception:
+                print(subreddit_name, 'failed:', exception)
+                requests_count[subreddit_name] = None
+            # end try
+        # end for
+    # end with
+    return requests_count
 
 
-# end with
 # end def
 
 
 MAX_RETRIEVED_ELEMENTS = 1000
 PUSHSHIFT_ENDPOINT = 'https://api.pushshift.io/reddit/search/'
+OUT_FOLDER = '/ais/hal9000/masih/codeswitch/allposts/'
+CURSOR_SUFFIX = '.cursor'
+CHUNK_SIZE = 1 << 16
+CRAWL_MODES = ['full', 'resume', 'update']
 
 
 def main():
-    subreddits = sys.argv[1] # file location containing list of subreddits to retrieve from
-    retrieval_type = sys.argv[2]
-    assert (retrieval_type in ['submission', 'comment'])
+    parser = argparse.ArgumentParser(description='crawls posts of a list of subreddits from pushshift')
+    parser.add_argument('subreddits', help='file location containing list of subreddits to retrieve from')
+    parser.add_argument('retrieval_type', choices=['submission', 'comment'])
+    parser.add_argument('--workers', type=int, default=1, help='number of subreddits crawled concurrently')
+    parser.add_argument('--rate', type=float, default=None, help='global limit of requests per second')
+    parser.add_argument('--out_folder', default=OUT_FOLDER)
+    parser.add_argument('--endpoint', default=PUSHSHIFT_ENDPOINT)
+    parser.add_argument('--mode', choices=CRAWL_MODES, default='full',
+                        help='crawl from scratch, resume an interrupted crawl or fetch only newer posts')
+    parser.add_argument('--compression', choices=[c for c in COMPRESSION_SUFFIXES if c is not None], default=None,
+                        help='write compressed JSONL dumps')
+    args = parser.parse_args()
+
     sub_lst = []
-    with open(subreddits, 'r') as fin:
+    with open(args.subreddits, 'r') as fin:
         for line in fin:
             subreddit_name = line.strip()
+            if not subreddit_name: continue
             sub_lst.append(subreddit_name)
-    for x in sub_lst:
-        crawl_subreddit_data(x)
+    crawl_subreddits(sub_lst, args.retrieval_type, args.workers, args.rate, args.out_folder, args.endpoint,
+                     args.mode, args.compression)
 
 
 if __name__ == '__main__':
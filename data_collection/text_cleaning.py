@@ -0,0 +1,181 @@
+import re
+import sys
+import random
+import timeit
+
+"""
+Regex-based sanitizing of raw Reddit comments, the first step of code_switch_extraction.clean_text
+"""
+
+REPLY_PATTERN = re.compile('&gt;.*')  # remove replies to
+ENTITY_PATTERN = re.compile('&.*;')  # remove replied to
+SUBREDDIT_PATTERN = re.compile(r'r/.*\s')  # remove any subreddit links
+USER_PATTERN = re.compile(r'u/.*\s')  # remove user names
+
+# line breaks and tabs are by far the most common non printable characters and are deleted with str.replace;
+# the rest of the Latin-1 range (controls, nbsp, soft hyphen) with a precompiled character class and
+# anything rarer (zero width and line separators, private use) with a fallback filter
+COMMON_NON_PRINTABLE = ['\n', '\r', '\t']
+LATIN1_NON_PRINTABLE_PATTERN = re.compile(
+    '[' + re.escape(''.join(chr(code) for code in range(256) if not chr(code).isprintable())) + ']+')
+
+MAX_QUOTE_TOKENS = 5
+
+
+def sanitize_text(text):
+    """
+    Remove replies, subreddit and user links, non printable characters and quotes longer than 5 words;
+    every pattern is compiled once and skipped altogether when its anchor does not occur in the text;
+    the four substitutions stay separate since each one sees the output of the previous one
+    :param text: str the raw text to be cleaned
+    :return: str
+        the same output as legacy_sanitize_text
+    """
+    new_string = text
+    if '&gt;' in new_string:
+        new_string = REPLY_PATTERN.sub(' ', new_string)
+    if '&' in new_string:
+        new_string = ENTITY_PATTERN.sub(' ', new_string)
+    if 'r/' in new_string:
+        new_string = SUBREDDIT_PATTERN.sub(' ', new_string)
+    if 'u/' in new_string:
+        new_string = USER_PATTERN.sub(' ', new_string)
+    if not new_string.isprintable():
+        for char in COMMON_NON_PRINTABLE:
+            new_string = new_string.replace(char, '')
+        if not new_string.isprintable():
+            new_string = LATIN1_NON_PRINTABLE_PATTERN.sub('', new_string)
+            if not new_string.isprintable():
+                new_string = ''.join(filter(str.isprintable, new_string))
+
+    # the text is a single line now, so the greedy '".*"' of the legacy version
+    # matches at most one span: from the first to the last double quote
+    start = new_string.find('"')
+    if start != -1:
+        end = new_string.rfind('"')
+        if end > start and len(new_string[start:end + 1].split()) > MAX_QUOTE_TOKENS:
+            new_string = new_string[:start] + ' ' + new_string[end + 1:]
+
+    return new_string
+
+
+def legacy_sanitize_text(text):
+    """
+    The original sanitizer, kept as the reference for check_golden and benchmark
+    :param text: str the raw text to be cleaned
+    :return: str
+    """
+    new_string = re.sub('&gt;.*', ' ', text)  # remove replies to
+    new_string = re.sub('&.*;', ' ', new_string)  # remove replied to
+    new_string = re.sub(r'r/.*\s', ' ', new_string)  # remove any subreddit links
+    new_string = re.sub(r'u/.*\s', " ", new_string)  # remove user names
+    new_string = ''.join(z for z in new_string if z.isprintable())
+
+    string_list = re.findall('\".*\"', new_string)
+
+    # remove quotes that are longer than 5 words in length
+    for string in string_list:
+        token_count = len(string.split())
+        if token_count > 5:
+            new_string = new_string.replace(string, " ")
+
+    return new_string
+
+
+GOLDEN_TEXTS = [
+    '',
+    'plain english comment without anything special',
+    'Salamat po sa info, very helpful talaga!',
+    '&gt; quoted reply line\nmy answer to it',
+    'first line\n&gt; quote in the middle\nlast line',
+    'Tom &amp; Jerry; and more &lt;3',
+    'check out r/Philippines for more\nand r/Greece too ',
+    'thanks u/someone for the gold\nreally',
+    'no trailing whitespace r/Romania',
+    'he said "this is a quote of more than five words" and left',
+    'short "quoted bit" stays',
+    '"one" and "two" and "three four five six seven"',
+    'a single " quote character',
+    'tabs\tand\r\nwindows line breaks\x00and controls\x7f',
+    'non\xa0breaking\u200bzero width\u2028line separator',
+    'Ελληνικά και English μαζί "με μια μεγάλη παράθεση εδώ μέσα τώρα"',
+    'Привет r/russia user u/ivan &amp; "короткая цитата"',
+    'for/against and/or u/ r/ & ; "',
+    '\n\n\n',
+    '   leading and trailing spaces   ',
+]
+
+
+def random_text(rng, length=200):
+    """
+    :param rng: random.Random
+    :param length: int
+    :return: str
+        a random text made of the characters and anchors the sanitizer reacts to
+    """
+    alphabet = ['a', 'b', 'ñ', 'λ', ' ', ' ', '\n', '\t', '\xa0', '\u200b', '\u2028', '"', '&', ';', '&gt;', '&amp;',
+                'r/', 'u/', 'word ', 'salamat ']
+    return ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, length)))
+
+
+def check_golden(random_samples=10000, seed=0):
+    """
+    assert that sanitize_text reproduces legacy_sanitize_text on the golden texts and random texts
+    :param random_samples: int
+        number of additional random texts
+    :param seed: int
+    """
+    rng = random.Random(seed)
+    texts = GOLDEN_TEXTS + [random_text(rng) for _ in range(random_samples)] + \
+        [realistic_text(rng) for _ in range(random_samples)]
+    for text in texts:
+        expected = legacy_sanitize_text(text)
+        actual = sanitize_text(text)
+        assert actual == expected, (text, expected, actual)
+    print('sanitize_text matches the legacy version on', len(texts), 'texts')
+
+
+def realistic_text(rng):
+    """
+    :param rng: random.Random
+    :return: str
+        a synthetic comment shaped like the crawled ones: a few lines of words, now and then
+        a reply quote, an html entity, a subreddit or user link or a quotation
+    """
+    words = ['the', 'and', 'you', 'this', 'really', 'think', 'people', 'salamat', 'talaga', 'naman',
+             'είναι', 'και', 'это', 'очень', 'bine', 'sunt', 'tidak', 'yang', 'lol', 'country']
+    lines = []
+    for _ in range(rng.randint(1, 4)):
+        line = ' '.join(rng.choice(words) for _ in range(rng.randint(3, 25)))
+        extra = rng.random()
+        if extra < 0.1:
+            line = '&gt; ' + line
+        elif extra < 0.15:
+            line += ' &amp; more'
+        elif extra < 0.2:
+            line += ' see r/' + rng.choice(words)
+        elif extra < 0.25:
+            line += ' thanks u/' + rng.choice(words)
+        elif extra < 0.3:
+            line += ' "' + ' '.join(rng.choice(words) for _ in range(rng.randint(2, 9))) + '"'
+        lines.append(line)
+    return '\n\n'.join(lines)
+
+
+def benchmark(number=20000):
+    """
+    print the per-comment cost of the legacy and the current sanitizer over synthetic comments
+    :param number: int
+        number of sanitized comments per measurement
+    """
+    rng = random.Random(1)
+    texts = [realistic_text(rng) for _ in range(1000)]
+    for function in [legacy_sanitize_text, sanitize_text]:
+        seconds = timeit.timeit(lambda: [function(text) for text in texts], number=max(1, number // len(texts)))
+        print(function.__name__, '{0:.2f}'.format(1e6 * seconds / (len(texts) * max(1, number // len(texts)))),
+              'us/comment')
+
+
+if __name__ == '__main__':
+    check_golden()
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
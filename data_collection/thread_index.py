@@ -0,0 +1,274 @@
+import os
+import struct
+import argparse
+import numpy as np
+import pandas as pd
+from array import array
+from pathlib import Path
+
+from dump_io import find_dump, get_decoder, open_dump
+from dump_index import id_to_int
+
+"""
+Conversation threads of the crawled comments: parent/child adjacency over integer node numbers,
+stored in a binary file of flat arrays and memory-mapped when loaded, so ancestor and subtree
+queries over millions of comments touch no JSON and build no Python dicts
+"""
+
+MAGIC = b'CSTHR001'
+HEADER = struct.Struct('<8sQQ')  # magic, number of nodes, number of reply edges
+NO_PARENT = -1  # top-level comment, or parent comment not crawled
+COMMENT_PREFIX = 't1_'
+CSV_CHUNK_SIZE = 100000
+
+
+def int_to_id(number):
+    """
+    :param number: int
+    :return: str reddit base36 id, without a type prefix
+    """
+    return np.base_repr(int(number), 36).lower()
+
+
+def iter_dump_edges(dump_path, decoder='auto'):
+    """
+    :param dump_path: location of a comment dump, plain or compressed
+    :param decoder: JSON decoder name, see dump_io.get_decoder
+    :return: generator of tuples
+        (id, link id, parent id, parent is a comment) for every comment, ids as integers
+    """
+    decode = get_decoder(decoder)
+    with open_dump(dump_path) as lines:
+        for line in lines:
+            try:
+                record = decode(line)
+                yield (id_to_int(record['id']), id_to_int(record['link_id']), id_to_int(record['parent_id']),
+                       record['parent_id'].startswith(COMMENT_PREFIX))
+            except (ValueError, KeyError, AttributeError):
+                continue  # blank or broken line, or not a comment
+
+
+def iter_csv_edges(csv_file, chunk_size=CSV_CHUNK_SIZE):
+    """
+    :param csv_file: an extraction csv file (Post.header columns)
+    :param chunk_size: int
+        rows read at a time
+    :return: generator of tuples, as iter_dump_edges
+    """
+    for chunk in pd.read_csv(csv_file, usecols=['id', 'link_id', 'parent_id'], dtype=str, encoding='utf-8',
+                             chunksize=chunk_size):
+        for post_id, link_id, parent_id in chunk.dropna().itertuples(index=False):
+            yield id_to_int(post_id), id_to_int(link_id), id_to_int(parent_id), parent_id.startswith(COMMENT_PREFIX)
+
+
+def csv_ids(csv_file, chunk_size=CSV_CHUNK_SIZE):
+    """
+    :param csv_file: an extraction csv file
+    :param chunk_size: int
+        rows read at a time
+    :return: numpy array of the integer ids of its posts
+    """
+    ids = array('Q')
+    for chunk in pd.read_csv(csv_file, usecols=['id'], dtype=str, encoding='utf-8', chunksize=chunk_size):
+        ids.extend(id_to_int(post_id) for post_id in chunk['id'].dropna())
+    return np.frombuffer(ids, dtype=np.uint64)
+
+
+class ThreadIndex:
+    """
+    Comments are numbered by increasing id: ids[i] is the id of node i, links[i] the id of its submission
+    and parents[i] the node it replies to (NO_PARENT if none). The children of node i are
+    children[child_offsets[i]:child_offsets[i + 1]], a compressed sparse row layout of the reply edges
+    """
+
+    def __init__(self, ids, links, parents, child_offsets, children):
+        self.ids = ids
+        self.links = links
+        self.parents = parents
+        self.child_offsets = child_offsets
+        self.children = children
+
+    @classmethod
+    def from_edges(cls, edges):
+        """
+        :param edges: iterable of tuples (id, link id, parent id, parent is a comment), ids as integers,
+            e.g. from iter_dump_edges or iter_csv_edges; repeated ids keep their first edge
+        :return: ThreadIndex
+        """
+        ids, links, parent_ids, parent_is_comment = array('Q'), array('Q'), array('Q'), array('b')
+        for post_id, link_id, parent_id, is_comment in edges:
+            ids.append(post_id)
+            links.append(link_id)
+            parent_ids.append(parent_id)
+            parent_is_comment.append(is_comment)
+        ids = np.frombuffer(ids, dtype=np.uint64)
+        ids, first = np.unique(ids, return_index=True)
+        links = np.frombuffer(links, dtype=np.uint64)[first]
+        parent_ids = np.frombuffer(parent_ids, dtype=np.uint64)[first]
+        parent_is_comment = np.frombuffer(parent_is_comment, dtype=np.int8)[first].astype(bool)
+
+        # parent ids to node numbers, submissions and comments missing from the crawl have no node
+        parents = np.searchsorted(ids, parent_ids).astype(np.int64)
+        found = parent_is_comment & (parents < len(ids))
+        found[found] = ids[parents[found]] == parent_ids[found]
+        parents[~found] = NO_PARENT
+
+        replies = np.flatnonzero(parents != NO_PARENT)
+        children = replies[np.argsort(parents[replies], kind='stable')].astype(np.uint64)
+        child_offsets = np.zeros(len(ids) + 1, dtype=np.uint64)
+        np.cumsum(np.bincount(parents[replies], minlength=len(ids)), out=child_offsets[1:])
+        return cls(ids, links, parents, child_offsets, children)
+
+    @classmethod
+    def build(cls, sources, decoder='auto'):
+        """
+        :param sources: list of comment dumps (plain or compressed) and extraction csv files
+        :param decoder: JSON decoder name, see dump_io.get_decoder
+        :return: ThreadIndex
+        """
+        def edges():
+            for source in sources:
+                if str(source).endswith('.csv'):
+                    yield from iter_csv_edges(source)
+                else:
+                    yield from iter_dump_edges(source, decoder)
+        return cls.from_edges(edges())
+
+    def save(self, path):
+        tmp_path = Path(str(path) + '.tmp')
+        with open(tmp_path, 'wb') as fout:
+            fout.write(HEADER.pack(MAGIC, len(self.ids), len(self.children)))
+            for values, dtype in [(self.ids, '<u8'), (self.links, '<u8'), (self.parents, '<i8'),
+                                  (self.child_offsets, '<u8'), (self.children, '<u8')]:
+                fout.write(np.ascontiguousarray(values, dtype=dtype).tobytes())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        memory-map a saved thread index
+        :param path: location of the index file
+        :return: ThreadIndex
+        """
+        with open(path, 'rb') as fin:
+            magic, n_nodes, n_edges = HEADER.unpack(fin.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(str(path) + ' is not a thread index')
+        arrays = []
+        offset = HEADER.size
+        for dtype, length in [('<u8', n_nodes), ('<u8', n_nodes), ('<i8', n_nodes), ('<u8', n_nodes + 1),
+                              ('<u8', n_edges)]:
+            arrays.append(np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(length,)) if length else
+                          np.zeros(0, dtype=dtype))
+            offset += 8 * length
+        return cls(*arrays)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def node(self, post_id):
+        """
+        :param post_id: str reddit id, with or without a type prefix
+        :return: int
+            node number of the comment, None if not indexed
+        """
+        key = id_to_int(post_id)
+        position = int(np.searchsorted(self.ids, key))
+        if position < len(self.ids) and int(self.ids[position]) == key:
+            return position
+        return None
+
+    def node_ancestors(self, node):
+        """
+        :param node: int
+        :return: list of node numbers, from the parent of node up to the top of its thread
+        """
+        ancestors = []
+        node = int(self.parents[node])
+        while node != NO_PARENT:
+            ancestors.append(node)
+            node = int(self.parents[node])
+        return ancestors
+
+    def node_subtree(self, node):
+        """
+        :param node: int
+        :return: numpy array of the node numbers of all replies below node, level by level
+        """
+        levels = []
+        frontier = np.array([node], dtype=np.int64)
+        while len(frontier):
+            starts = self.child_offsets[frontier].astype(np.int64)
+            ends = self.child_offsets[frontier + 1].astype(np.int64)
+            sizes = ends - starts
+            if not sizes.sum():
+                break
+            # positions of all the children of the frontier, without a loop over the frontier
+            positions = np.repeat(starts - np.cumsum(sizes) + sizes, sizes) + np.arange(sizes.sum())
+            frontier = self.children[positions].astype(np.int64)
+            levels.append(frontier)
+        return np.concatenate(levels) if levels else np.zeros(0, dtype=np.int64)
+
+    def ancestors(self, post_id):
+        """
+        :param post_id: str reddit id, with or without a type prefix
+        :return: list of str
+            ids of the comments post_id replies to, nearest first; empty if post_id is not indexed
+        """
+        node = self.node(post_id)
+        return [] if node is None else [int_to_id(self.ids[i]) for i in self.node_ancestors(node)]
+
+    def subtree(self, post_id):
+        """
+        :param post_id: str reddit id, with or without a type prefix
+        :return: list of str
+            ids of all the (direct and indirect) replies to post_id
+        """
+        node = self.node(post_id)
+        return [] if node is None else [int_to_id(self.ids[i]) for i in self.node_subtree(node)]
+
+    def mask(self, ids):
+        """
+        :param ids: numpy array of integer ids, e.g. from csv_ids
+        :return: numpy boolean array, True for the nodes whose id is in ids
+        """
+        ids = np.unique(ids)
+        positions = np.searchsorted(ids, self.ids)
+        found = positions < len(ids)
+        found[found] = ids[positions[found]] == self.ids[found]
+        return found
+
+    def reply_counts(self, mask):
+        """
+        how replies follow their parent: e.g. with mask marking the code switch comments,
+        counts[True][True] is the number of code switch replies to code switch comments
+        :param mask: numpy boolean array over the nodes
+        :return: dict
+            parent marked -> reply marked -> number of replies
+        """
+        replies = np.flatnonzero(self.parents != NO_PARENT)
+        parent_marked = mask[self.parents[replies]]
+        reply_marked = mask[replies]
+        return {parent: {reply: int(np.count_nonzero((parent_marked == parent) & (reply_marked == reply)))
+                         for reply in [False, True]} for parent in [False, True]}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='builds the thread index of crawled country subreddits')
+    parser.add_argument('countries', nargs='+')
+    parser.add_argument('--input_folder', default='/ais/hal9000/masih/codeswitch/allposts/')
+    parser.add_argument('--out_file', required=True, help='location of the thread index')
+    parser.add_argument('--csv', default=None,
+                        help='extraction csv: report how replies to code switch comments switch as well')
+    args = parser.parse_args()
+
+    dumps = [find_dump(Path(args.input_folder) / f"{country}.comment.json.out") for country in args.countries]
+    index = ThreadIndex.build(dumps)
+    index.save(args.out_file)
+    print(len(index), 'comments', len(index.children), 'replies')
+    if args.csv is not None:
+        counts = index.reply_counts(index.mask(csv_ids(args.csv)))
+        for parent in [True, False]:
+            total = sum(counts[parent].values())
+            print('replies to {0} comments: {1}, code switched: {2:.2%}'.format(
+                'code switch' if parent else 'other', total, counts[parent][True] / total if total else 0.0))
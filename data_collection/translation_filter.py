@@ -0,0 +1,126 @@
+import re
+import csv
+import argparse
+import numpy as np
+import pandas as pd
+
+"""
+Detection of translation posts (posts asking for or discussing translations) by the words and phrases
+of translation_prob.csv, for single posts, batches of posts and existing CSV files
+"""
+
+
+class TranslationMatcher:
+    """
+    Matches texts against a list of translation words and multi-word phrases; a text matches if,
+    after lower-casing, one of its whitespace-separated tokens is a translation word, or a sequence
+    of its tokens is a translation phrase. Empty texts are considered translation posts (nothing is
+    left of them to detect)
+    """
+
+    def __init__(self, phrases):
+        """
+        :param phrases: iterable of str translation words and phrases
+        """
+        self.words = set()
+        multi_word = []
+        for phrase in phrases:
+            tokens = phrase.lower().split()
+            if len(tokens) == 1:
+                self.words.add(tokens[0])
+            elif len(tokens) > 1:
+                multi_word.append(r'\s+'.join(re.escape(token) for token in tokens))
+        # a single alternation is scanned in one pass, tokens are delimited by whitespace as in str.split
+        self.pattern = re.compile(r'(?<!\S)(?:' + '|'.join(sorted(multi_word)) + r')(?!\S)') if multi_word else None
+
+    @classmethod
+    def from_file(cls, filename):
+        """
+        :param filename: a csv file with a translation word or phrase in the first column, e.g. translation_prob.csv
+        :return: TranslationMatcher
+        """
+        with open(filename, 'r', encoding='utf-8') as fin:
+            return cls(line[0] for line in csv.reader(fin) if line)
+
+    def matches(self, text):
+        """
+        :param text: str
+        :return: bool
+            True if text is a translation post
+        """
+        if text == "":
+            return True
+        lowered = text.lower()
+        if not self.words.isdisjoint(lowered.split()):
+            return True
+        return self.pattern is not None and self.pattern.search(lowered) is not None
+
+    def mask(self, texts):
+        """
+        :param texts: pandas.Series of str, or any iterable of str
+        :return: boolean mask, True for translation posts;
+            a pandas.Series aligned with texts, or a numpy array for other iterables
+        """
+        if isinstance(texts, pd.Series):
+            return self.mask_series(texts)
+        return np.fromiter((self.matches(text) for text in texts), dtype=bool)
+
+    def mask_series(self, texts):
+        """
+        vectorized mask over a string column: tokens are exploded into one long column
+        and intersected with the translation words at once
+        :param texts: pandas.Series of str (missing values count as empty texts)
+        :return: pandas.Series of bool, aligned with texts
+        """
+        lowered = texts.fillna("").astype(str).str.lower().reset_index(drop=True)
+        tokens = lowered.str.split().explode()
+        hits = tokens.isin(self.words).groupby(level=0).any().reindex(lowered.index, fill_value=False)
+        hits |= lowered == ""
+        if self.pattern is not None:
+            hits |= lowered.str.contains(self.pattern)
+        hits.index = texts.index
+        return hits
+
+
+def filter_csv(in_file, out_file, matcher, column='Text', annotate=False, chunk_size=100000):
+    """
+    standalone pass over an existing CSV (e.g. the extraction output): drop the translation posts,
+    or keep all rows and add a boolean 'is_translation' column
+    :param in_file: input csv file
+    :param out_file: output csv file
+    :param matcher: TranslationMatcher
+    :param column: name of the text column
+    :param annotate: bool
+        add the mask as a column instead of dropping the matching rows
+    :param chunk_size: int
+        rows read at a time
+    :return: tuple
+        number of rows read, number of translation posts
+    """
+    total = translations = 0
+    header = True
+    for chunk in pd.read_csv(in_file, encoding='utf-8', chunksize=chunk_size):
+        mask = matcher.mask(chunk[column])
+        total += len(chunk)
+        translations += int(mask.sum())
+        if annotate:
+            chunk['is_translation'] = mask
+        else:
+            chunk = chunk[~mask]
+        chunk.to_csv(out_file, mode='w' if header else 'a', header=header, index=False, encoding='utf-8')
+        header = False
+    return total, translations
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='removes (or marks) translation posts in a csv file')
+    parser.add_argument('in_file')
+    parser.add_argument('out_file')
+    parser.add_argument('--words', default='translation_prob.csv', help='csv file with translation words/phrases')
+    parser.add_argument('--column', default='Text')
+    parser.add_argument('--annotate', action='store_true', help='add an is_translation column instead of dropping')
+    args = parser.parse_args()
+
+    total, translations = filter_csv(args.in_file, args.out_file, TranslationMatcher.from_file(args.words),
+                                     args.column, args.annotate)
+    print('rows:', total, 'translation posts:', translations)
@@ -1,4 +1,4 @@
-import csv, sys
+import sys
 import numpy as np
 from scipy.stats import spearmanr
 from scipy.stats import pearsonr
@@ -6,6 +6,8 @@ from scipy.stats import wilcoxon
 from nltk.tokenize import word_tokenize
 sys.path.append('../')
 from utils import Serialization
+from lexicon import Lexicon
+from author_index import AuthorIndex
 
 
 class Formality():
@@ -43,26 +45,21 @@ class Formality():
     def load_data(filename, common_users):
         """
         generates a dictionary of user to all their (cs or monolingual) posts
-        :param filename: csv file with user posts
+        :param filename: csv file with user posts, or its Parquet conversion (see corpus_io)
         :param common_users: a list of users who have both cs and monolingual texts
         :return: user to posts map
         """
         texts = {}
-        with open(filename, 'r') as fin:
-            print('reading', filename)
-            csv_reader = csv.reader(fin, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
-            header = csv_reader.__next__()
-            for line in csv_reader:
-                if len(line) < 8: continue
-                if len(line[7].split()) < MIN_SENTENCE_LENGTH: continue
-                author = line[0].strip()
-                if author not in common_users: continue
-
-                text_by_author = texts.get(author, [])
-                text_by_author.append(' '.join(word_tokenize(line[7].strip().lower())))
-                texts[author] = text_by_author
-            # end for
-        # end with
+        print('reading', filename)
+        # only the posts of common users are read, through the (stored) author index of the file
+        for author, text in AuthorIndex.open(filename).posts(common_users, [0, 7]):
+            if len(text.split()) < MIN_SENTENCE_LENGTH: continue
+            author = author.strip()
+
+            text_by_author = texts.get(author, [])
+            text_by_author.append(' '.join(word_tokenize(text.strip().lower())))
+            texts[author] = text_by_author
+        # end for
 
         object_name = '<cs or monolingual texts by author>'
         Serialization.save_obj(texts, object_name)
@@ -81,12 +78,13 @@ class Formality():
         """
         cs_markers_frequency = []
         non_cs_markers_frequency = []
-        ranks = Serialization.load_obj('dict.ranks')
+        lexicon = Lexicon.build(Serialization.load_obj('dict.ranks'), max_rank=MAX_WORD_RANK)
+        markers = set(markers)
         for author in cs_texts:
             if len(cs_texts[author].split()) > MIN_POSTS_PER_USER and \
                     len(non_cs_texts.get(author, '').split()) > MIN_POSTS_PER_USER:
-                cs_markers_frequency.append(Formality.count_markers(cs_texts[author], markers, ranks))
-                non_cs_markers_frequency.append(Formality.count_markers(non_cs_texts[author], markers, ranks))
+                cs_markers_frequency.append(Formality.count_markers(cs_texts[author], markers, lexicon))
+                non_cs_markers_frequency.append(Formality.count_markers(non_cs_texts[author], markers, lexicon))
             # end if
         # end for
         print('extracted informality markers', len(cs_markers_frequency))
@@ -94,20 +92,19 @@ class Formality():
     # end def
 
     @staticmethod
-    def count_markers(text, markers, ranks):
+    def count_markers(text, markers, lexicon):
         """
         computes frequency of (in)formality markers in a given text
         :param text: post text
-        :param markers: a list of markers to consider
-        :param ranks: english frequency word-rank dictionary
+        :param markers: a set of markers to consider
+        :param lexicon: english frequency word-rank Lexicon
         :return: (in)formality markers frequency
         """
-        indicators = []
-        for token in text.lower().split():
-            if ranks.get(token, sys.maxsize) > MAX_WORD_RANK and token not in markers: continue
-            indicators.append(1 if token in markers else 0)
-        # end for
-        return float(sum(indicators))/len(indicators)
+        tokens = text.lower().split()
+        is_marker = np.fromiter((token in markers for token in tokens), dtype=bool, count=len(tokens))
+        # markers, and the other frequent words
+        indicators = is_marker | (lexicon.rank[lexicon.ids(tokens)] <= MAX_WORD_RANK)
+        return float(is_marker.sum())/int(indicators.sum())
     # end def
 
     @staticmethod
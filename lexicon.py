@@ -0,0 +1,82 @@
+import numpy as np
+
+"""
+A vocabulary-indexed lexicon shared by the analysis modules: every word gets an integer id, and word
+frequency rank, age of acquisition, concreteness, function-word and alphabetic flags and length are
+NumPy arrays indexed by id, so per-text lexical statistics are gathers and masked means over token ids
+"""
+
+MISSING_RANK = np.iinfo(np.int64).max  # rank of words not in the ranks dictionary (as ranks.get(w, sys.maxsize))
+OOV = 0  # id of the words not in the lexicon
+
+
+class Lexicon:
+    def __init__(self, words, ranks=None, aoa=None, concreteness=None, function_words=()):
+        """
+        :param words: list of the words of the lexicon
+        :param ranks: word to frequency rank dictionary
+        :param aoa: word to age of acquisition dictionary
+        :param concreteness: word to concreteness dictionary
+        :param function_words: collection of function words
+        """
+        self.words = [''] + list(words)
+        self.index = {word: i for i, word in enumerate(self.words) if i != OOV}
+        ranks = ranks or {}
+        aoa = aoa or {}
+        concreteness = concreteness or {}
+        function_words = set(function_words)
+        self.rank = np.fromiter((ranks.get(word, MISSING_RANK) if i != OOV else MISSING_RANK
+                                 for i, word in enumerate(self.words)), dtype=np.int64, count=len(self.words))
+        self.aoa = np.fromiter((aoa.get(word, np.nan) if i != OOV else np.nan
+                                for i, word in enumerate(self.words)), dtype=np.float64, count=len(self.words))
+        self.concreteness = np.fromiter((concreteness.get(word, np.nan) if i != OOV else np.nan
+                                         for i, word in enumerate(self.words)), dtype=np.float64,
+                                        count=len(self.words))
+        self.is_function = self.word_mask(function_words)
+        self.is_alpha = np.fromiter((word.isalpha() for word in self.words), dtype=bool, count=len(self.words))
+        self.length = np.fromiter((len(word) for word in self.words), dtype=np.int64, count=len(self.words))
+    # end def
+
+    @staticmethod
+    def build(ranks, aoa=None, concreteness=None, function_words=(), max_rank=None):
+        """
+        :param ranks: word to frequency rank dictionary (e.g. dict.ranks)
+        :param aoa: word to age of acquisition dictionary
+        :param concreteness: word to concreteness dictionary
+        :param function_words: collection of function words
+        :param max_rank: int
+            leave out words ranked lower than max_rank (unless in another resource): for callers that only
+            compare ranks to thresholds up to max_rank, out-of-lexicon words are then the same as unranked ones
+        :return: Lexicon
+        """
+        ranked = ranks if max_rank is None else {word: rank for word, rank in ranks.items() if rank <= max_rank}
+        words = dict.fromkeys(ranked)
+        for resource in [aoa or {}, concreteness or {}, function_words]:
+            words.update(dict.fromkeys(resource))
+        # end for
+        return Lexicon(words, ranks, aoa, concreteness, function_words)
+    # end def
+
+    def __len__(self):
+        return len(self.words) - 1
+    # end def
+
+    def ids(self, tokens):
+        """
+        :param tokens: list of tokens
+        :return: numpy array of their ids, OOV for tokens not in the lexicon
+        """
+        index = self.index
+        return np.fromiter((index.get(token, OOV) for token in tokens), dtype=np.int64, count=len(tokens))
+    # end def
+
+    def word_mask(self, words):
+        """
+        :param words: collection of words
+        :return: numpy boolean array indexed by id, True for the lexicon words in words
+        """
+        mask = np.zeros(len(self.words), dtype=bool)
+        mask[[self.index[word] for word in set(words) if word in self.index]] = True
+        return mask
+    # end def
+# end class
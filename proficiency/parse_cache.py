@@ -0,0 +1,99 @@
+import os
+import sys
+import sqlite3
+import hashlib
+
+"""
+A persistent cache of constituency parses: hash(parser model, tokenized sentence) -> bracketed tree and
+its structural statistics (see Proficiency.tree_statistics), so reruns of the study parse only new sentences
+"""
+
+MAX_QUERY_PARAMETERS = 500
+STATISTICS = ('depth', 'clauses', 'nodes', 'leaves', 'branching')
+
+
+class ParseCache:
+    """
+    SQLite-backed; sentences the parser failed on are cached too (with no tree and no statistics),
+    so they are not retried on every run. Every process opens its own connection (WAL mode)
+    """
+
+    def __init__(self, path, model):
+        """
+        :param path: location of the SQLite database, created if missing
+        :param model: parser model name; parses of other models are never returned
+        """
+        self.path = path
+        self.model = model
+        self.pid = None
+        self.connection = None
+    # end def
+
+    def connect(self):
+        # a connection must not cross a fork: worker processes open their own
+        if self.pid != os.getpid():
+            self.connection = sqlite3.connect(str(self.path), timeout=600)
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute('PRAGMA synchronous=NORMAL')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS parses (key BLOB PRIMARY KEY, tree TEXT, ' +
+                                    ', '.join(name + (' REAL' if name == 'branching' else ' INTEGER')
+                                              for name in STATISTICS) + ')')
+            self.connection.commit()
+            self.pid = os.getpid()
+        # end if
+        return self.connection
+    # end def
+
+    def key(self, sentence):
+        """
+        :param sentence: str tokenized sentence
+        :return: bytes
+            16-byte hash of the parser model and the sentence
+        """
+        return hashlib.blake2b((self.model + '\0' + sentence).encode('utf-8'), digest_size=16).digest()
+    # end def
+
+    def get_many(self, sentences):
+        """
+        :param sentences: list of tokenized sentences
+        :return: dict
+            cached sentence -> statistics dictionary, None for sentences the parser failed on
+        """
+        keys = {self.key(sentence): sentence for sentence in sentences}
+        key_list = list(keys)
+        found = {}
+        for start in range(0, len(key_list), MAX_QUERY_PARAMETERS):
+            batch = key_list[start:start+MAX_QUERY_PARAMETERS]
+            query = 'SELECT key, ' + ', '.join(STATISTICS) + ' FROM parses WHERE key IN (' + \
+                    ','.join('?' * len(batch)) + ')'
+            for row in self.connect().execute(query, batch):
+                found[keys[row[0]]] = None if row[1] is None else dict(zip(STATISTICS, row[1:]))
+            # end for
+        # end for
+        return found
+    # end def
+
+    def put_many(self, entries):
+        """
+        :param entries: list of tuples (sentence, tree, statistics), tree and statistics None for failed parses
+        """
+        rows = []
+        for sentence, tree, statistics in entries:
+            bracketed = None if tree is None else tree.pformat(margin=sys.maxsize)
+            values = [None] * len(STATISTICS) if statistics is None else [statistics[name] for name in STATISTICS]
+            rows.append([self.key(sentence), bracketed] + values)
+        # end for
+        with self.connect():
+            self.connection.executemany('INSERT OR REPLACE INTO parses VALUES (' +
+                                        ', '.join('?' * (len(STATISTICS) + 2)) + ')', rows)
+        # end with
+    # end def
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+            self.pid = None
+        # end if
+    # end def
+# end class
@@ -1,8 +1,16 @@
 import re
+import os
 import sys, csv
+import time
+import functools
+import itertools
+import subprocess
+import multiprocessing as mp
 from scipy.stats import ranksums
 from scipy.stats import sem
 from nltk.tokenize import word_tokenize
+from nltk import Tree
+import random
 from random import shuffle
 import numpy as np
 
@@ -10,9 +18,12 @@ import benepar
 from polyglot.detect import Detector
 from en_function_words import FUNCTION_WORDS
 import countries
+from parse_cache import ParseCache
 
 sys.path.append('../')
 from utils import Serialization
+from lexicon import Lexicon
+from corpus_io import Corpus
 
 
 class DataProcessing:
@@ -20,26 +31,23 @@ class DataProcessing:
     def read_data(filename):
         """
         collect user data from all but country-specific subreddits
-        :param filename: a csv file with posts by all users subject for texting
+        :param filename: a csv file (without header) with posts by all users subject for texting,
+            or its Parquet conversion (see corpus_io)
         :return: user to posts dictionary, subreddits list
         """
         data = {}
         subreddits = []
-        with open(filename, 'r') as fin:
-            csv_reader = csv.reader(fin, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
-            for line in csv_reader:
-                if len(line) < 4: continue
-                # filter out all country-specific subreddits
-                if line[1].strip().lower() in countries.COUNTRIES: continue
-                subreddits.append(line[1].strip())
+        for author, subreddit, text in Corpus.read_columns(filename, [0, 1, 3], header=False):
+            # filter out all country-specific subreddits
+            if subreddit.strip().lower() in countries.COUNTRIES: continue
+            subreddits.append(subreddit.strip())
 
-                author = line[0].strip()
+            author = author.strip()
 
-                authors_texts = data.get(author, [])
-                authors_texts.append(line[3].strip())
-                data[author] = authors_texts
-            # end for
-        # end with
+            authors_texts = data.get(author, [])
+            authors_texts.append(text.strip())
+            data[author] = authors_texts
+        # end for
         return data, subreddits
     # end def
 
@@ -135,13 +143,204 @@ class DataProcessing:
 # end class
 
 
+class Resources:
+    """
+    lexical resources used by the metrics, loaded once per process on first use (and not at import time,
+    so that neither importing the module nor starting a worker process pays for the ones it doesn't need)
+    """
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def non_natives():
+        return DataProcessing.read_non_native_authors()
+    # end def
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def ranks():
+        return Serialization.load_obj('dict.ranks')
+    # end def
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def concreteness():
+        return DataProcessing.load_concreteness_scores(CONCRETENESS_FILE)
+    # end def
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def aoa():
+        return DataProcessing.load_aoa_scores(AOA_FILE)
+    # end def
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def lexicon():
+        return Lexicon.build(Resources.ranks(), Resources.aoa(), Resources.concreteness(), FUNCTION_WORDS,
+                             max_rank=MAX_WORD_RANK)
+    # end def
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def parser():
+        return benepar.Parser(PARSER_MODEL, batch_size=PARSE_BATCH_SIZE)
+    # end def
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def parse_cache():
+        return None if PARSE_CACHE_FILE is None else ParseCache(PARSE_CACHE_FILE, PARSER_MODEL)
+    # end def
+
+    @staticmethod
+    def benchmark_startup(processes=4):
+        """
+        prints the time to import this module in a fresh interpreter, to start a pool of (spawned) worker
+        processes, which re-import it, and to load every resource on first use
+        :param processes: number of worker processes
+        """
+        module_dir = os.path.dirname(os.path.abspath(__file__))
+        for name, code in [('interpreter', 'pass'), ('import proficiency', 'import proficiency')]:
+            started = time.perf_counter()
+            subprocess.run([sys.executable, '-c', code], cwd=module_dir, check=True)
+            print('{0:<24}{1:10.1f} ms'.format(name, 1000 * (time.perf_counter() - started)))
+        # end for
+
+        started = time.perf_counter()
+        with mp.get_context('spawn').Pool(processes) as pool:
+            pool.map(abs, range(processes), chunksize=1)  # a trivial task per worker
+        # end with
+        print('{0:<24}{1:10.1f} ms'.format('spawn ' + str(processes) + ' workers',
+                                           1000 * (time.perf_counter() - started)))
+
+        for name in ['non_natives', 'ranks', 'concreteness', 'aoa']:
+            started = time.perf_counter()
+            try:
+                getattr(Resources, name)()
+            except OSError as exception:
+                print('{0:<24}{1}'.format(name, exception))
+                continue
+            # end try
+            print('{0:<24}{1:10.1f} ms'.format(name, 1000 * (time.perf_counter() - started)))
+        # end for
+    # end def
+# end class
+
+
+class LexicalAccumulator:
+    """
+    streaming lexical metrics of an author's tokens: frequent (rank <= MAX_WORD_RANK) alphabetic tokens
+    count towards lexical density, the content (non-function) words among them towards NTTR, AoA, concreteness
+    and word length. Tokens are mapped to lexicon ids a chunk at a time, and the metrics updated by array
+    gathers and masked sums. Memory is O(NTTR window): the ids of the current, incomplete window.
+    Accumulators of consecutive shards of an author's posts merge into the accumulator of all of them; the
+    windows completed within each shard are kept and the incomplete windows left at the shards' ends are joined
+    """
+
+    def __init__(self, window=None):
+        """
+        :param window: # of tokens per type-to-token ratio window, NTTR_WINDOW by default
+        """
+        self.window = window or NTTR_WINDOW
+        self.window_ids = np.zeros(0, dtype=np.int64)
+        self.ttr_sum = 0.0
+        self.ttr_windows = 0
+        self.tokens = 0
+        self.content_tokens = 0
+        self.length_sum = 0
+        self.aoa_sum = 0.0
+        self.aoa_tokens = 0
+        self.concreteness_sum = 0.0
+        self.concreteness_tokens = 0
+    # end def
+
+    @staticmethod
+    def tokenize(texts):
+        """
+        :param texts: user posts
+        :return: generator of the lower-cased tokens of the posts, one post at a time
+        """
+        for text in texts:
+            yield from word_tokenize(text.lower())
+        # end for
+    # end def
+
+    def add_to_window(self, ids):
+        """
+        :param ids: numpy array of content word ids, in text order
+        """
+        pending = np.concatenate([self.window_ids, ids])
+        complete = len(pending) // self.window
+        for i in range(complete):
+            self.ttr_sum += float(len(np.unique(pending[i*self.window:(i+1)*self.window])))/self.window
+        # end for
+        self.ttr_windows += complete
+        self.window_ids = pending[complete*self.window:]
+    # end def
+
+    def update(self, tokens):
+        """
+        :param tokens: iterable of lower-cased tokens
+        """
+        lexicon = Resources.lexicon()
+        tokens = iter(tokens)
+        while True:
+            chunk = list(itertools.islice(tokens, TOKEN_CHUNK))
+            if not chunk: break
+            ids = lexicon.ids(chunk)
+            # words out of the lexicon are ranked lower than MAX_WORD_RANK, and left out with them
+            ids = ids[(lexicon.rank[ids] <= MAX_WORD_RANK) & lexicon.is_alpha[ids]]
+            self.tokens += len(ids)
+            ids = ids[~lexicon.is_function[ids]]
+            self.content_tokens += len(ids)
+            self.length_sum += int(lexicon.length[ids].sum())
+            for values, name in [(lexicon.aoa[ids], 'aoa'), (lexicon.concreteness[ids], 'concreteness')]:
+                known = values[~np.isnan(values)]
+                setattr(self, name + '_sum', getattr(self, name + '_sum') + float(known.sum()))
+                setattr(self, name + '_tokens', getattr(self, name + '_tokens') + len(known))
+            # end for
+            self.add_to_window(ids)
+        # end while
+    # end def
+
+    def merge(self, other):
+        """
+        :param other: LexicalAccumulator of the posts following this accumulator's
+        :return: self, now accumulating the posts of both
+        """
+        assert (self.window == other.window)
+        self.ttr_sum += other.ttr_sum
+        self.ttr_windows += other.ttr_windows
+        for name in ['tokens', 'content_tokens', 'length_sum', 'aoa_sum', 'aoa_tokens', 'concreteness_sum',
+                     'concreteness_tokens']:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        # end for
+        self.add_to_window(other.window_ids)
+        return self
+    # end def
+
+    def metrics(self):
+        """
+        :return: [nttr (None under one full window), lexical density, mean AoA, mean concreteness,
+            mean word length], undefined means as nan
+        """
+        nan = float('nan')
+        return [self.ttr_sum/self.ttr_windows if self.ttr_windows else None,
+                float(self.content_tokens)/self.tokens if self.tokens else nan,
+                self.aoa_sum/self.aoa_tokens if self.aoa_tokens else nan,
+                self.concreteness_sum/self.concreteness_tokens if self.concreteness_tokens else nan,
+                float(self.length_sum)/self.content_tokens if self.content_tokens else nan]
+    # end def
+# end class
+
+
 class Proficiency:
     @staticmethod
     def load_data(file_cs, file_monolingual):
         """
         loads posts by code-switchers and noncode-switchers
-        :param file_cs: a csv file with posts by frequent code-switching users
-        :param file_monolingual: a csv file with posts by user who don't (or very rarely) code-switch
+        :param file_cs: a csv (or Parquet) file with posts by frequent code-switching users
+        :param file_monolingual: a csv (or Parquet) file with posts by user who don't (or very rarely) code-switch
         :return:
         """
         data_cs, subreddits_cs = DataProcessing.read_data(file_cs)
@@ -166,10 +365,9 @@ class Proficiency:
         :return: normalized type-to-token ratio
         """
         nttrs = []
-        STTY_STEP = 1000
-        if len(tokens) < STTY_STEP: return None
-        for i in range(0, len(tokens)-STTY_STEP, STTY_STEP):
-            current_batch = tokens[i:i+STTY_STEP]
+        if len(tokens) < NTTR_WINDOW: return None
+        for i in range(0, len(tokens)-NTTR_WINDOW+1, NTTR_WINDOW):
+            current_batch = tokens[i:i+NTTR_WINDOW]
             nttrs.append(float(len(set(current_batch)))/len(current_batch))
         # end for
         return np.mean(nttrs)
@@ -193,8 +391,9 @@ class Proficiency:
         :param tokens: a list of tokens
         :return: lexical density
         """
-        content = [1 if token not in FUNCTION_WORDS else 0 for token in tokens]
-        return float(sum(content))/len(tokens)
+        lexicon = Resources.lexicon()
+        content = ~lexicon.is_function[lexicon.ids(tokens)]
+        return float(content.sum())/len(tokens)
     # end def
 
     @staticmethod
@@ -204,12 +403,9 @@ class Proficiency:
         :param tokens: a list of tokens
         :return: AoA
         """
-        rates = []
-        for token in tokens:
-            if token not in aoa.keys(): continue
-            rates.append(aoa[token])
-        # end for
-        return np.mean(rates)
+        lexicon = Resources.lexicon()
+        rates = lexicon.aoa[lexicon.ids(tokens)]
+        return np.mean(rates[~np.isnan(rates)])
 
     # end def
 
@@ -220,42 +416,21 @@ class Proficiency:
         :param tokens: a list of tokens
         :return: mean concreteness
         """
-        rates = []
-        for token in tokens:
-            if token not in concreteness.keys(): continue
-            rates.append(concreteness[token])
-        # end for
-        return np.mean(rates)
+        lexicon = Resources.lexicon()
+        rates = lexicon.concreteness[lexicon.ids(tokens)]
+        return np.mean(rates[~np.isnan(rates)])
     # end def
 
     @staticmethod
     def compute_lexical_metrics(texts):
         """
-        given user posts, concatenates them and computes all lexical metrics
+        given user posts, computes all lexical metrics in a single pass over their tokens
         :param texts: user posts
         :return: an array of lexical metrics
         """
-        clean_tokens = []
-        clean_content_tokens = []
-        tokenized = word_tokenize(' '.join(texts).lower())
-
-        for token in tokenized:
-            if ranks.get(token, sys.maxsize) > MAX_WORD_RANK: continue
-            if not token.isalpha(): continue # consider only words
-            clean_tokens.append(token)
-            if token in FUNCTION_WORDS: continue
-            clean_content_tokens.append(token)
-        # end for
-
-        nttr = Proficiency.norm_type_to_token_ratio(clean_content_tokens)
-        mean_aoa = Proficiency.average_age_of_acquisition(clean_content_tokens)
-        mean_concreteness = Proficiency.mean_word_concreteness(clean_content_tokens)
-        mean_length = Proficiency.mean_word_length(clean_content_tokens)
-        # consider all tokens (content and functional)
-        lexical_density = Proficiency.lexical_density(clean_tokens)
-
-        return [nttr, lexical_density, mean_aoa, mean_concreteness, mean_length]
-
+        accumulator = LexicalAccumulator()
+        accumulator.update(LexicalAccumulator.tokenize(texts))
+        return accumulator.metrics()
     # end def
 
     @staticmethod
@@ -269,6 +444,43 @@ class Proficiency:
         return np.mean(lengths)
     # end def
 
+    @staticmethod
+    def tree_statistics(tree):
+        """
+        computes structural statistics of a parsing tree in a single traversal
+        :param tree: parsing tree (nltk Tree, leaves are strings)
+        :return: dictionary with
+            depth: max depth of a (non-leaf) node, the root being at depth 0
+            clauses: # of S, SBAR and SBARQ nodes
+            nodes: # of non-leaf nodes
+            leaves: # of leaves (tokens)
+            branching: mean # of children of the nodes above the pre-terminals
+        """
+        depth = clauses = nodes = leaves = phrases = phrase_children = 0
+        stack = [(tree, 0)]
+        while stack:
+            node, node_depth = stack.pop()
+            nodes += 1
+            if node_depth > depth: depth = node_depth
+            if node.label() in CLAUSE_LABELS: clauses += 1
+            children = 0
+            for child in node:
+                if isinstance(child, str):
+                    leaves += 1
+                else:
+                    children += 1
+                    stack.append((child, node_depth + 1))
+                # end if
+            # end for
+            if children:
+                phrases += 1
+                phrase_children += len(node)
+            # end if
+        # end while
+        return {'depth': depth, 'clauses': clauses, 'nodes': nodes, 'leaves': leaves,
+                'branching': float(phrase_children) / phrases if phrases else 0.0}
+    # end def
+
     @staticmethod
     def get_tree_depth(tree):
         """
@@ -276,43 +488,142 @@ class Proficiency:
         :param tree: parsing tree
         :return: max depth
         """
-        positions = []
-        leaves = len(tree.leaves())
-        leavepos = set(tree.leaf_treeposition(n) for n in range(leaves))
-        for pos in tree.treepositions():
-            if pos not in leavepos:
-                positions.append(len(pos))
+        return Proficiency.tree_statistics(tree)['depth']
+    # end def
+
+    @staticmethod
+    def benchmark_tree_statistics(n=2000, tokens=70, seed=0):
+        """
+        compares tree_statistics to the former depth computation (every tree position, and a set of the leaf
+        positions) followed by a second pass for the clauses, on random deep trees of up to 70 tokens
+        :param n: # of trees
+        :param tokens: max # of tokens per tree
+        :param seed: random seed
+        """
+        rng = random.Random(seed)
+        labels = ['S', 'SBAR', 'SBARQ', 'NP', 'VP', 'PP', 'ADJP', 'ADVP']
+
+        def random_tree(words):
+            if len(words) == 1:
+                return Tree('NN', words)
             # end if
+            # mostly right-branching, as long Reddit sentences with nested clauses tend to be
+            split = 1 if rng.random() < 0.6 else rng.randint(1, len(words) - 1)
+            return Tree(rng.choice(labels), [random_tree(words[:split]), random_tree(words[split:])])
+        # end def
+
+        def legacy_statistics(tree):
+            positions = []
+            leaves = len(tree.leaves())
+            leavepos = set(tree.leaf_treeposition(i) for i in range(leaves))
+            for pos in tree.treepositions():
+                if pos not in leavepos:
+                    positions.append(len(pos))
+                # end if
+            # end for
+            clauses = sum(1 for subtree in tree.subtrees() if subtree.label() in CLAUSE_LABELS)
+            return max(positions), clauses
+        # end def
+
+        trees = [random_tree(['w' + str(i) for i in range(rng.randint(3, tokens))]) for _ in range(n)]
+        for tree in trees:
+            statistics = Proficiency.tree_statistics(tree)
+            assert (legacy_statistics(tree) == (statistics['depth'], statistics['clauses']))
+        # end for
+        for name, function in [('legacy', legacy_statistics), ('tree_statistics', Proficiency.tree_statistics)]:
+            started = time.perf_counter()
+            for tree in trees: function(tree)
+            print('{0:<24}{1:10.1f} us/tree'.format(name, 1e6 * (time.perf_counter() - started) / n))
         # end for
-        return max(positions)
     # end def
 
     @staticmethod
-    def parsing_metrics(parser, sentences):
+    def parse_sentence(parser, sentence):
+        """
+        :param parser: parser
+        :param sentence: a sentence
+        :return: parsing tree, None if the sentence could not be parsed
+        """
+        try:
+            return parser.parse(sentence)
+        except ValueError as exception:
+            print(exception)
+            return None
+        # end try
+    # end def
+
+    @staticmethod
+    def parse_sentences(parser, sentences, batch_size=None):
+        """
+        parses sentences in batches of similar length (so that little of each batch is padding);
+        a batch that fails is parsed again sentence by sentence, so only the failing sentences are lost
+        :param parser: parser
+        :param sentences: a list of sentences
+        :param batch_size: sentences per parse_sents call, PARSE_BATCH_SIZE by default
+        :return: a list of parsing trees (None for sentences that could not be parsed), in sentences order
+        """
+        batch_size = batch_size or PARSE_BATCH_SIZE
+        order = sorted(range(len(sentences)), key=lambda i: len(sentences[i].split()))
+        trees = [None] * len(sentences)
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start+batch_size]
+            try:
+                parsed = list(parser.parse_sents([sentences[i] for i in batch]))
+            except ValueError:
+                parsed = [Proficiency.parse_sentence(parser, sentences[i]) for i in batch]
+            # end try
+            for i, tree in zip(batch, parsed):
+                trees[i] = tree
+            # end for
+        # end for
+        return trees
+    # end def
+
+    @staticmethod
+    def sentence_statistics(parser, sentences, batch_size=None):
+        """
+        tree statistics of sentences, parsing only those missing from the parse cache (and caching them)
+        :param parser: parser
+        :param sentences: a list of tokenized sentences
+        :param batch_size: sentences parsed at a time, PARSE_BATCH_SIZE by default
+        :return: a list of tree_statistics dictionaries (None for sentences that could not be parsed)
+        """
+        cache = Resources.parse_cache()
+        known = cache.get_many(sentences) if cache is not None else {}
+        missing = [sentence for sentence in dict.fromkeys(sentences) if sentence not in known]
+        trees = Proficiency.parse_sentences(parser, missing, batch_size)
+        parsed = [(sentence, tree, None if tree is None else Proficiency.tree_statistics(tree))
+                  for sentence, tree in zip(missing, trees)]
+        if cache is not None and parsed:
+            cache.put_many(parsed)
+        # end if
+        known.update((sentence, statistics) for sentence, _, statistics in parsed)
+        return [known[sentence] for sentence in sentences]
+    # end def
+
+    @staticmethod
+    def parsing_metrics(parser, sentences, batch_size=None, seed=None):
         """
         computes mean max parsing tree depth and the total # of clauses in a sentence
         :param parser: parser
         :param sentences: a list of sentences
+        :param batch_size: sentences parsed at a time, PARSE_BATCH_SIZE by default
+        :param seed: seed for sampling the sentences to parse, SAMPLE_SEED by default;
+            with a seed the same sentences are sampled on every run (and found in the parse cache)
         :return: metrics
         """
-        shuffle(sentences)
+        seed = SAMPLE_SEED if seed is None else seed
+        if seed is None:
+            shuffle(sentences)
+            sample = sentences[:MAX_PARSED_SENTENCES]
+        else:
+            sample = random.Random(seed).sample(sentences, min(MAX_PARSED_SENTENCES, len(sentences)))
+        # end if
         clauses = []; depths = []
-        for sentence in sentences[:500]:
-            sentence_clauses = 0
-            try:
-                tree = parser.parse(sentence)
-            except ValueError as exception:
-                print(exception)
-                continue
-            # end try
-
-            for subtree in tree.subtrees():
-                if subtree.label() in ['S', 'SBAR', 'SBARQ']:
-                    sentence_clauses += 1
-                # end if
-            # end for
-            clauses.append(sentence_clauses if sentence_clauses > 0 else 1)
-            depths.append(Proficiency.get_tree_depth(tree))
+        for statistics in Proficiency.sentence_statistics(parser, sample, batch_size):
+            if statistics is None: continue
+            clauses.append(statistics['clauses'] if statistics['clauses'] > 0 else 1)
+            depths.append(statistics['depth'])
         # end for
 
         return np.mean(clauses), np.mean(depths)
@@ -326,7 +637,7 @@ class Proficiency:
         :return: an array of grammatical metrics
         """
         sentences = []
-        parser = benepar.Parser("benepar_en2")
+        parser = Resources.parser()
         for sentence in re.split('\.|\! |\? |\n', '\n'.join(texts)):
             sentence = re.sub(r'\s+', ' ', sentence).strip()
             if len(sentence.split()) < 3 or len(sentence.split()) > 70: continue
@@ -341,21 +652,56 @@ class Proficiency:
     # end def
 
     @staticmethod
-    def extract_proficiency_metrics(objname):
+    def init_worker():
+        """
+        process pool initializer: loads the parser and the lexical resources once per worker
+        """
+        Resources.parser()
+        Resources.lexicon()
+    # end def
+
+    @staticmethod
+    def author_metrics(task):
+        """
+        :param task: tuple (author, posts)
+        :return: tuple (author, lexical and grammatical metrics)
+        """
+        author, texts = task
+        author_metrics = Proficiency.compute_lexical_metrics(texts)
+        author_metrics.extend(Proficiency.compute_grammatical_metrics(texts))
+        return author, author_metrics
+    # end def
+
+    @staticmethod
+    def extract_proficiency_metrics(objname, processes=1, chunksize=1):
         """
         extract lexical and grammatical proficiency metrics given user to posts data
         :param objname: pickle object with user to posts data
+        :param processes: number of worker processes, 1 to compute the metrics in this process
+        :param chunksize: authors sent to a worker at a time
         :return:
         """
-        metrics = {}
         data = Serialization.load_obj(objname)
+        authors = [author for author in data if len(data[author]) >= MIN_POSTS_FOR_TEST]
+        # the most prolific authors first, so that no worker is left with a long one at the end
+        tasks = ((author, data[author]) for author in sorted(authors, key=lambda author: -len(data[author])))
+
+        computed = {}
+        if processes > 1:
+            with mp.Pool(processes, initializer=Proficiency.init_worker) as pool:
+                for author, author_metrics in pool.imap_unordered(Proficiency.author_metrics, tasks, chunksize):
+                    computed[author] = author_metrics
+                    print(author, author_metrics); sys.stdout.flush()
+                # end for
+            # end with
+        else:
+            for author, author_metrics in map(Proficiency.author_metrics, tasks):
+                computed[author] = author_metrics
+                print(author, author_metrics); sys.stdout.flush()
+            # end for
+        # end if
 
-        for author in data:
-            if len(data[author]) < MIN_POSTS_FOR_TEST: continue
-            metrics[author] = Proficiency.compute_lexical_metrics(data[author])
-            metrics[author].extend(Proficiency.compute_grammatical_metrics(data[author]))
-            print(author, metrics[author]); sys.stdout.flush()
-        # end for
+        metrics = {author: computed[author] for author in authors}  # in data order, as computed serially
         Serialization.save_obj(metrics, objname.replace('data', 'metrics.lex.gramm.clean'))
         print(len(metrics))
     # end def
@@ -390,6 +736,8 @@ class Proficiency:
 
 
 MAX_WORD_RANK = 10000
+NTTR_WINDOW = 1000  # tokens per type-to-token ratio window
+TOKEN_CHUNK = 10000  # tokens mapped to lexicon ids at a time
 MIN_POSTS_FOR_TEST = 50
 DATA_CS = 'data.cs.by.author'
 DATA_MONOLINGUAL = 'data.monolingual.by.author'
@@ -400,12 +748,15 @@ METRICS_MONOLINGUAL = 'metrics.lex.gramm.clean.mono.by.author'
 
 DETECTOR_CONFIDENCE = 90
 
-non_natives = DataProcessing.read_non_native_authors()
-ranks = Serialization.load_obj('dict.ranks')
-filename = '<a file with english words concreteness ratings>'
-concreteness = DataProcessing.load_concreteness_scores(filename)
-filename = '<a file with english words AoA ratings>'
-aoa = DataProcessing.load_aoa_scores(filename)
+CLAUSE_LABELS = {'S', 'SBAR', 'SBARQ'}
+PARSER_MODEL = 'benepar_en2'
+PARSE_BATCH_SIZE = 64  # sentences per parser call, bucketed by length
+MAX_PARSED_SENTENCES = 500  # sentences sampled for parsing per author
+SAMPLE_SEED = 0  # None to sample a different random subset on every run
+PARSE_CACHE_FILE = os.path.join(Serialization.root, 'parse.cache.sqlite')  # None to disable the parse cache
+PROCESSES = mp.cpu_count()
+CONCRETENESS_FILE = '<a file with english words concreteness ratings>'
+AOA_FILE = '<a file with english words AoA ratings>'
 
 if __name__ == '__main__':
     """
@@ -413,13 +764,21 @@ if __name__ == '__main__':
     https://polyglot.readthedocs.io/en/latest/Detection.html
     https://pypi.org/project/benepar/
     """
+    if sys.argv[1:] == ['--benchmark_startup']:
+        Resources.benchmark_startup()
+        sys.exit()
+    # end if
+    if sys.argv[1:] == ['--benchmark_trees']:
+        Proficiency.benchmark_tree_statistics()
+        sys.exit()
+    # end if
 
     file_cs = '<a csv file with cs posts>'
     file_monolingual = '<a csv file with monolingual english posts>'
     Proficiency.load_data(file_cs, file_monolingual)
 
-    Proficiency.extract_proficiency_metrics(DATA_CS_CLEAN)
-    Proficiency.extract_proficiency_metrics(DATA_MONOLINGUAL_CLEAN)
+    Proficiency.extract_proficiency_metrics(DATA_CS_CLEAN, PROCESSES)
+    Proficiency.extract_proficiency_metrics(DATA_MONOLINGUAL_CLEAN, PROCESSES)
 
     DataProcessing.filter_out_non_english_posts(DATA_MONOLINGUAL)
 
@@ -17,6 +17,8 @@ from pprint import pprint
 
 sys.path.append('../')
 from utils import Serialization
+from lexicon import Lexicon
+from author_index import AuthorIndex
 
 
 class Utils:
@@ -139,16 +141,13 @@ class Utils:
         :param ranks: a map of word to frequency rank
         :return: a list of posts with content words
         """
+        # words out of the lexicon are unranked, and filtered out as such
+        lexicon = Lexicon.build(ranks, max_rank=MAX_WORD_RANK)
+        content = (lexicon.length >= 4) & (lexicon.length < 15) & (lexicon.rank >= MIN_WORD_RANK) & \
+            (lexicon.rank <= MAX_WORD_RANK) & ~lexicon.word_mask(NAMED_ENTITIES + list(stop_words))
         docs = []
         for doc in data:
-            words = []
-            for word in doc:
-                if len(word) not in range(4, 15): continue
-                if word in NAMED_ENTITIES or word in stop_words: continue
-                if ranks.get(word, 0) < MIN_WORD_RANK or ranks.get(word, sys.maxsize) > MAX_WORD_RANK: continue
-
-                words.append(word.lower())
-            # end for
+            words = [doc[i].lower() for i in np.flatnonzero(content[lexicon.ids(doc)])]
             if len(words) < 10: continue
             docs.append(words)
         # end for
@@ -209,31 +208,16 @@ class Utils:
         """
         extract a set of user with both code-switched and english monolingual posts
         """
-        users_cs = []
+        # csv or Parquet (see corpus_io); the author indexes are built once and stored next to the files
         filename = '<a csv file with code-switched posts>'
-        with open(filename, 'r') as fin:
-            csv_reader = csv.reader(fin, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
-            header = csv_reader.__next__()
-            for line in csv_reader:
-                if len(line) < 8: continue
-                users_cs.append(line[0].strip())
-            # end for
-        # end with
+        users_cs = AuthorIndex.open(filename)
 
-        users_non_cs = []
         filename = '<a csv file with monolingual enlgish posts>'
-        with open(filename, 'r') as fin:
-            csv_reader = csv.reader(fin, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
-            header = csv_reader.__next__()
-            for line in csv_reader:
-                if len(line) < 8: continue
-                users_non_cs.append(line[0].strip())
-            # end for
-        # end with
+        users_non_cs = AuthorIndex.open(filename)
 
-        common_users = set(users_cs).intersection(set(users_non_cs))
-        print('total cs users, monolingual users, common users:', len(set(users_cs)),
-              len(set(users_non_cs)), len(common_users))
+        common_users = users_cs.common_authors(users_non_cs)
+        print('total cs users, monolingual users, common users:', len(users_cs),
+              len(users_non_cs), len(common_users))
 
         Serialization.save_obj(common_users, 'common.users')
 
@@ -243,22 +227,15 @@ class Utils:
     def lemmatization_and_pos_filter(filename, common_users):
         """
         preprocessing data towards topic modeling
-        :param filename: a csv file with code-switched or monolingual data
+        :param filename: a csv file with code-switched or monolingual data, or its Parquet conversion
         :param common_users: a list of user with both types of posts
         """
         stop_words = stopwords.words('english')
-        with open(filename, 'r') as fin:
-            csv_reader = csv.reader(fin, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
-            header = csv_reader.__next__()
-
-            data = []
-            for line in csv_reader:
-                if len(line) < 8: continue
-                if len(line[7].split()) < MIN_SENTENCE_LENGTH: continue
-                if line[0].strip() not in common_users: continue
-                data.append(line[7])
-            # end for
-        # end with
+        data = []
+        for text, in AuthorIndex.open(filename).posts(common_users, [7]):
+            if len(text.split()) < MIN_SENTENCE_LENGTH: continue
+            data.append(text)
+        # end for
 
         print('total of', len(data), 'posts')
         tokens = sum([len(post.split()) for post in data])
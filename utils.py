@@ -1,33 +1,292 @@
+import os
+import sys
+import mmap
+import time
+import zlib
+import random
 import pickle
+import struct
+import tempfile
+from array import array
+from collections.abc import Mapping
+
+
+class MappedDict(Mapping):
+    """
+    read-only str -> int (or str -> float) map stored in a memory-mapped file: an open-addressing hash table
+    (crc32 of the utf-8 key, linear probing) over entries kept in insertion order, so a lookup touches a few
+    pages of the file and opening it costs nothing regardless of its size. Lookups (hits and misses) are memoized
+    """
+    MAGIC = b'CSMAP001'
+    HEADER = struct.Struct('<8sQQ8s')  # magic, number of entries, number of slots, value typecode
+    EMPTY = -1
+    MISSING = object()
+
+    def __init__(self, path):
+        """
+        :param path: a file written by MappedDict.save
+        """
+        self.path = path
+        with open(path, 'rb') as fin:
+            self.mmap = mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ)
+        # end with
+        magic, self.size, n_slots, typecode = MappedDict.HEADER.unpack_from(self.mmap)
+        if magic != MappedDict.MAGIC:
+            raise ValueError(path + ' is not a mapped dictionary')
+        # end if
+        typecode = typecode.rstrip(b'\0').decode()
+        self.mask = n_slots - 1
+
+        view = memoryview(self.mmap)
+        start = MappedDict.HEADER.size
+        self.slots = view[start:start + 4 * n_slots].cast('i')
+        start += 4 * n_slots
+        self.offsets = view[start:start + 8 * (self.size + 1)].cast('Q')
+        start += 8 * (self.size + 1)
+        self.value_array = view[start:start + 8 * self.size].cast(typecode)
+        start += 8 * self.size
+        self.keys_data = view[start:]
+        self.cache = {}
+    # end def
+
+    @staticmethod
+    def supports(obj):
+        """
+        :return: True for a dictionary of str keys and either all int or all float values
+        """
+        if not isinstance(obj, dict) or not obj:
+            return False
+        # end if
+        if not all(type(key) is str for key in obj):
+            return False
+        # end if
+        return all(type(value) is int for value in obj.values()) or \
+            all(type(value) is float for value in obj.values())
+    # end def
+
+    @staticmethod
+    def save(obj, path):
+        """
+        :param obj: dictionary of str keys and int (or float) values, see supports
+        :param path: output file location
+        """
+        typecode = 'q' if all(type(value) is int for value in obj.values()) else 'd'
+        n_slots = 1
+        while n_slots < 2 * len(obj):
+            n_slots *= 2
+        # end while
+        mask = n_slots - 1
+
+        slots = array('i', [MappedDict.EMPTY]) * n_slots
+        offsets = array('Q', [0])
+        keys_data = []
+        for i, key in enumerate(obj):
+            data = key.encode('utf-8')
+            keys_data.append(data)
+            offsets.append(offsets[-1] + len(data))
+            slot = zlib.crc32(data) & mask
+            while slots[slot] != MappedDict.EMPTY:
+                slot = (slot + 1) & mask
+            # end while
+            slots[slot] = i
+        # end for
+
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as fout:
+            fout.write(MappedDict.HEADER.pack(MappedDict.MAGIC, len(obj), n_slots, typecode.encode()))
+            fout.write(slots.tobytes())
+            fout.write(offsets.tobytes())
+            fout.write(array(typecode, obj.values()).tobytes())
+            fout.write(b''.join(keys_data))
+        # end with
+        os.replace(tmp_path, path)
+    # end def
+
+    def find(self, key):
+        """
+        :return: the entry number of key, -1 if missing
+        """
+        data = key.encode('utf-8')
+        slot = zlib.crc32(data) & self.mask
+        while True:
+            i = self.slots[slot]
+            if i == MappedDict.EMPTY:
+                return -1
+            # end if
+            if self.keys_data[self.offsets[i]:self.offsets[i + 1]] == data:
+                return i
+            # end if
+            slot = (slot + 1) & self.mask
+        # end while
+    # end def
+
+    def get(self, key, default=None):
+        try:
+            value = self.cache[key]
+        except KeyError:
+            if type(key) is not str:
+                return default
+            # end if
+            i = self.find(key)
+            value = self.cache[key] = self.value_array[i] if i >= 0 else MappedDict.MISSING
+        # end try
+        return default if value is MappedDict.MISSING else value
+    # end def
+
+    def __getitem__(self, key):
+        value = self.get(key, MappedDict.MISSING)
+        if value is MappedDict.MISSING:
+            raise KeyError(key)
+        # end if
+        return value
+    # end def
+
+    def __contains__(self, key):
+        return self.get(key, MappedDict.MISSING) is not MappedDict.MISSING
+    # end def
+
+    def __len__(self):
+        return self.size
+    # end def
+
+    def __iter__(self):
+        for i in range(self.size):
+            yield bytes(self.keys_data[self.offsets[i]:self.offsets[i + 1]]).decode('utf-8')
+        # end for
+    # end def
+
+    def items(self):
+        return zip(iter(self), self.value_array)
+    # end def
+
+    def __reduce__(self):
+        # worker processes re-open the file instead of receiving its content
+        return MappedDict, (self.path,)
+    # end def
+# end class
 
 
 class Serialization:
+    """
+    objects are stored under Serialization.root (the SERIALIZATION_ROOT environment variable, ../pickle/ by
+    default): dictionaries of str to int/float (e.g. dict.ranks) as memory-mapped MappedDict files (.map),
+    anything else pickled (.pkl); load_obj picks whichever file exists
+    """
+    root = os.environ.get('SERIALIZATION_ROOT', '../pickle/')
+
+    @staticmethod
+    def path(name, suffix, root=None):
+        return os.path.join(Serialization.root if root is None else root, name + suffix)
+    # end def
+
     @staticmethod
-    def save_obj(obj, name):
+    def save_obj(obj, name, root=None, fmt=None):
         """
         serialization of an object
         :param obj: object to serialize
         :param name: file name to store the object
+        :param root: directory to store the object in, Serialization.root by default
+        :param fmt: 'map' or 'pickle'; by default 'map' whenever MappedDict supports the object
         """
-        with open('../pickle/' + name + '.pkl', 'wb') as fout:
-            pickle.dump(obj, fout, pickle.HIGHEST_PROTOCOL)
-        # end with
+        if fmt is None:
+            fmt = 'map' if MappedDict.supports(obj) else 'pickle'
+        # end if
+        assert (fmt in ['map', 'pickle'])
+        if fmt == 'map':
+            MappedDict.save(obj, Serialization.path(name, '.map', root))
+        else:
+            with open(Serialization.path(name, '.pkl', root), 'wb') as fout:
+                pickle.dump(obj, fout, pickle.HIGHEST_PROTOCOL)
+            # end with
+        # end if
+        # a stale copy in the other format would shadow (or be shadowed by) this one
+        stale = Serialization.path(name, '.pkl' if fmt == 'map' else '.map', root)
+        if os.path.exists(stale):
+            os.remove(stale)
+        # end if
     # end def
 
     @staticmethod
-    def load_obj(name):
+    def load_obj(name, root=None):
         """
         de-serialization of an object
         :param name: file name to load the object from
+        :param root: directory to load the object from, Serialization.root by default
+        :return: the object; a read-only MappedDict for objects stored as maps
         """
-        with open('../pickle/' + name + '.pkl', 'rb') as fout:
+        path = Serialization.path(name, '.map', root)
+        if os.path.exists(path):
+            return MappedDict(path)
+        # end if
+        with open(Serialization.path(name, '.pkl', root), 'rb') as fout:
             return pickle.load(fout)
         # end with
     # end def
+
+    @staticmethod
+    def convert(name, root=None):
+        """
+        re-store a pickled object in the memory-mapped format, if it supports it
+        :param name: file name of the object
+        :param root: directory of the object, Serialization.root by default
+        :return: True if the object was converted
+        """
+        with open(Serialization.path(name, '.pkl', root), 'rb') as fout:
+            obj = pickle.load(fout)
+        # end with
+        if not MappedDict.supports(obj):
+            return False
+        # end if
+        Serialization.save_obj(obj, name, root, 'map')
+        return True
+    # end def
+
+    @staticmethod
+    def benchmark(n=500000, lookups=100000, seed=0):
+        """
+        print load and lookup times of a word -> rank dictionary of n entries (as dict.ranks) per format
+        :param n: int
+            number of entries
+        :param lookups: int
+            number of random (present and missing) keys looked up after loading
+        :param seed: int
+        """
+        rng = random.Random(seed)
+        ranks = {}
+        while len(ranks) < n:
+            ranks[''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(2, 12)))] = len(ranks)
+        # end while
+        keys = list(ranks)
+        queries = [rng.choice(keys) if rng.random() < 0.8 else 'missing' + str(i) for i in range(lookups)]
+
+        with tempfile.TemporaryDirectory() as root:
+            for fmt in ['pickle', 'map']:
+                Serialization.save_obj(ranks, 'dict.ranks', root, fmt)
+                started = time.perf_counter()
+                loaded = Serialization.load_obj('dict.ranks', root)
+                loading = time.perf_counter() - started
+                started = time.perf_counter()
+                for query in queries:
+                    loaded.get(query, sys.maxsize)
+                # end for
+                lookup = time.perf_counter() - started
+                print('{0:<8} load {1:9.2f} ms  lookup {2:6.2f} us/key'.format(fmt, 1000 * loading,
+                                                                             1e6 * lookup / lookups))
+                del loaded
+            # end for
+        # end with
+    # end def
 # end class
 
 
 if __name__ == '__main__':
-    pass
+    # python utils.py <object name> ...: re-store pickled string maps (e.g. dict.ranks) as memory-mapped files
+    if len(sys.argv) > 1:
+        for name in sys.argv[1:]:
+            print(name, 'converted' if Serialization.convert(name) else 'kept as pickle')
+        # end for
+    else:
+        Serialization.benchmark()
+    # end if
 
 # end if